@@ -1,6 +1,22 @@
+from celery.signals import before_task_publish, task_postrun, task_prerun
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+
+from .authentication import invalidate_saved_user
+from .instrumentation import install_query_profiler
+from .task_metrics import task_metrics
 
 
 class CommonConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "common"
+
+    def ready(self):
+        connection_created.connect(install_query_profiler)
+        post_save.connect(invalidate_saved_user, sender=settings.AUTH_USER_MODEL)
+        post_delete.connect(invalidate_saved_user, sender=settings.AUTH_USER_MODEL)
+        before_task_publish.connect(task_metrics.stamp, weak=False)
+        task_prerun.connect(task_metrics.start, weak=False)
+        task_postrun.connect(task_metrics.finish, weak=False)
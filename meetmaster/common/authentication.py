@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.cache import cache
+from django.utils.crypto import constant_time_compare
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+ACCESS_SALT = "common.authentication.access"
+REFRESH_SALT = "common.authentication.refresh"
+
+
+def _user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def issue_tokens(user):
+    payload = {"user_id": user.pk, "hash": user.get_session_auth_hash()}
+    return {
+        "access": signing.dumps(payload, salt=ACCESS_SALT, compress=True),
+        "refresh": signing.dumps(payload, salt=REFRESH_SALT, compress=True),
+        "expires_in": settings.TOKEN_ACCESS_LIFETIME,
+    }
+
+
+def _load_token(token, salt, max_age):
+    try:
+        return signing.loads(token, salt=salt, max_age=max_age)
+    except signing.SignatureExpired:
+        raise exceptions.AuthenticationFailed("Token has expired.")
+    except signing.BadSignature:
+        raise exceptions.AuthenticationFailed("Invalid token.")
+
+
+def _check_token_user(user, payload):
+    # The session auth hash is derived from the password hash, so changing the password revokes issued tokens.
+    if user is None or not user.is_active or not constant_time_compare(payload["hash"], user.get_session_auth_hash()):
+        raise exceptions.AuthenticationFailed("Invalid token.")
+    return user
+
+
+def get_token_user(token, salt, max_age):
+    payload = _load_token(token, salt, max_age)
+    return _check_token_user(get_cached_user(payload["user_id"]), payload)
+
+
+async def aget_token_user(token, salt, max_age):
+    payload = _load_token(token, salt, max_age)
+    return _check_token_user(await aget_cached_user(payload["user_id"]), payload)
+
+
+def get_cached_user(user_id):
+    key = _user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user, settings.TOKEN_USER_CACHE_TTL)
+    return user
+
+
+async def aget_cached_user(user_id):
+    key = _user_cache_key(user_id)
+    user = await cache.aget(key)
+    if user is None:
+        user = await get_user_model().objects.filter(pk=user_id).afirst()
+        if user is not None:
+            await cache.aset(key, user, settings.TOKEN_USER_CACHE_TTL)
+    return user
+
+
+def invalidate_cached_user(user_id):
+    cache.delete(_user_cache_key(user_id))
+
+
+def invalidate_saved_user(sender, instance, **kwargs):
+    # Connected to post_save and post_delete of the user model, so a new password, a deactivation or a deletion from
+    # anywhere (API, admin, shell) applies to the next request instead of after TOKEN_USER_CACHE_TTL.
+    invalidate_cached_user(instance.pk)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    keyword = "Bearer"
+
+    def authenticate(self, request):
+        token = self.get_token(request)
+        if token is None:
+            return None
+        return get_token_user(token, ACCESS_SALT, settings.TOKEN_ACCESS_LIFETIME), token
+
+    async def aauthenticate(self, request):
+        token = self.get_token(request)
+        if token is None:
+            return None
+        return await aget_token_user(token, ACCESS_SALT, settings.TOKEN_ACCESS_LIFETIME), token
+
+    def get_token(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+
+        try:
+            return auth[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed("Invalid token header.")
+
+    def authenticate_header(self, request):
+        return f'{self.keyword} realm="api"'
@@ -0,0 +1,268 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from uuid import uuid4
+
+import redis
+from django.conf import settings
+
+from .metric_stores import LocalMetricStore, RedisMetricStore, format_number
+
+logger = logging.getLogger(__name__)
+
+_current_profile = ContextVar("request_profile", default=None)
+_current_trace_id = ContextVar("trace_id", default="")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METHODS = {"GET", "HEAD", "OPTIONS", "POST", "PUT", "PATCH", "DELETE"}
+TRACE_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,64}")
+STATS_KEY = "meetmaster:request_metrics"
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.statements = Counter()
+        self.serializer_time = 0.0
+        self.serializing = False
+        self.emails = 0
+
+    @property
+    def duplicate_queries(self):
+        # Statements are compared without their parameters, so N+1 lookups count as duplicates too.
+        return sum(count - 1 for count in self.statements.values() if count > 1)
+
+    def most_duplicated(self):
+        statement, count = self.statements.most_common(1)[0] if self.statements else (None, 0)
+        return (statement, count) if count > 1 else (None, 0)
+
+    def server_timing(self, duration):
+        return (
+            f"app;dur={duration * 1000:.1f}, "
+            f'db;dur={self.query_time * 1000:.1f};desc="queries={self.queries} duplicates={self.duplicate_queries}", '
+            f"serializer;dur={self.serializer_time * 1000:.1f}"
+        )
+
+
+@contextmanager
+def profile_request(sampled=True):
+    if not sampled:
+        yield None
+        return
+    profile = RequestProfile()
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+def get_trace_id():
+    return _current_trace_id.get()
+
+
+@contextmanager
+def use_trace_id(trace_id):
+    token = _current_trace_id.set(trace_id or "")
+    try:
+        yield
+    finally:
+        _current_trace_id.reset(token)
+
+
+def request_trace_id(request):
+    # Reuse the id of a proxy or client so their logs can be correlated, as long as it is safe to log and store.
+    trace_id = request.headers.get("X-Request-ID", "")
+    return trace_id if TRACE_ID_PATTERN.fullmatch(trace_id) else uuid4().hex
+
+
+def profile_query(execute, sql, params, many, context):
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.queries += 1
+        profile.query_time += time.perf_counter() - started
+        profile.statements[sql] += 1
+
+
+def install_query_profiler(sender, connection, **kwargs):
+    # connection_created fires on every reconnect of the same wrapper, so only install the profiler once.
+    if profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_query)
+
+
+def time_serializer(method, *args):
+    profile = _current_profile.get()
+    if profile is None or profile.serializing:
+        return method(*args)
+    profile.serializing = True
+    started = time.perf_counter()
+    try:
+        return method(*args)
+    finally:
+        profile.serializing = False
+        profile.serializer_time += time.perf_counter() - started
+
+
+def record_emails(count):
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.emails += count
+
+
+def view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unresolved"
+    view = getattr(match.func, "cls", None)
+    if view is None:
+        return f"{match.func.__module__}.{match.func.__name__}"
+    action = (getattr(match.func, "actions", None) or {}).get(request.method.lower())
+    return f"{view.__name__}.{action}" if action else view.__name__
+
+
+def format_labels(**labels):
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def render_histogram(name, description, buckets, series):
+    # series yields (labels, per-bucket counts with +Inf last, sum of observations).
+    lines = [f"# HELP {name} {description}", f"# TYPE {name} histogram"]
+    for labels, counts, total in series:
+        cumulative = 0
+        for bound, count in zip((*buckets, "+Inf"), counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{format_labels(**labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{format_labels(**labels)} {total}")
+        lines.append(f"{name}_count{format_labels(**labels)} {cumulative}")
+    return lines
+
+
+def bucket_index(buckets, value):
+    return next((i for i, bound in enumerate(buckets) if value <= bound), len(buckets))
+
+
+class MetricsRegistry:
+    # Gunicorn runs several workers, so each process buffers its counts and adds them to a store shared by all of them
+    # (a Redis hash when METRICS_REDIS_URL is set) at most every METRICS_FLUSH_INTERVAL seconds. Whichever worker
+    # answers a scrape then reports every worker's requests, and counters never go backwards between scrapes.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._store = None
+        self._pending = Counter()
+        self._flushed_at = time.monotonic()
+
+    @property
+    def store(self):
+        if self._store is None:
+            url = settings.METRICS_REDIS_URL
+            self._store = RedisMetricStore(url, STATS_KEY) if url else LocalMetricStore()
+        return self._store
+
+    def reset(self):
+        with self._lock:
+            self._pending = Counter()
+        self.store.reset()
+
+    def observe(self, view, method, status, duration, profile=None):
+        method = method if method in METHODS else "other"
+        values = {
+            f"requests|{view}|{method}|{status}": 1,
+            f"duration_bucket|{view}|{bucket_index(DURATION_BUCKETS, duration)}": 1,
+            f"duration_sum|{view}|": duration,
+        }
+        if profile is not None:
+            values.update(
+                {
+                    f"requests_profiled|{view}|": 1,
+                    f"queries|{view}|": profile.queries,
+                    f"query_time|{view}|": profile.query_time,
+                    f"duplicates|{view}|": profile.duplicate_queries,
+                    f"serializer_time|{view}|": profile.serializer_time,
+                }
+            )
+        with self._lock:
+            self._pending.update(values)
+            due = time.monotonic() - self._flushed_at >= settings.METRICS_FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return
+        try:
+            self.store.increment(pending)
+        except redis.RedisError:
+            logger.warning("Could not record request metrics", exc_info=True)
+            # Kept for the next flush, so an outage of the store delays counts instead of losing them.
+            with self._lock:
+                self._pending.update(pending)
+
+    def render(self):
+        self.flush()
+        try:
+            values = self.store.values()
+        except redis.RedisError:
+            logger.warning("Could not read request metrics", exc_info=True)
+            return ""
+
+        series = defaultdict(lambda: defaultdict(dict))
+        for field, value in values.items():
+            metric, view, extra = field.split("|", 2)
+            series[metric][view][extra] = value
+
+        lines = [
+            "# HELP meetmaster_http_requests_total Requests handled, by view, method and status.",
+            "# TYPE meetmaster_http_requests_total counter",
+        ]
+        for view, counts in sorted(series["requests"].items()):
+            for key, count in sorted(counts.items()):
+                method, status = key.split("|")
+                labels = format_labels(view=view, method=method, status=status)
+                lines.append(f"meetmaster_http_requests_total{labels} {format_number(count)}")
+
+        lines += render_histogram(
+            "meetmaster_http_request_duration_seconds",
+            "Time spent producing a response, by view.",
+            DURATION_BUCKETS,
+            [
+                (
+                    {"view": view},
+                    [int(buckets.get(str(i), 0)) for i in range(len(DURATION_BUCKETS) + 1)],
+                    series["duration_sum"][view][""],
+                )
+                for view, buckets in sorted(series["duration_bucket"].items())
+            ],
+        )
+
+        sampled = [
+            ("profiled_requests_total", "requests_profiled", "Requests profiled for queries and serializer time."),
+            ("db_queries_total", "queries", "Database queries run by profiled requests."),
+            ("db_query_duration_seconds_total", "query_time", "Time spent in database queries."),
+            ("db_duplicate_queries_total", "duplicates", "Queries repeating an earlier statement of the request."),
+            ("serializer_duration_seconds_total", "serializer_time", "Time spent in serializers."),
+        ]
+        for metric, key, description in sampled:
+            lines += [f"# HELP meetmaster_{metric} {description}", f"# TYPE meetmaster_{metric} counter"]
+            for view, value in sorted(series[key].items()):
+                lines.append(f"meetmaster_{metric}{format_labels(view=view)} {format_number(value[''])}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
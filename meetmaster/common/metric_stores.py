@@ -0,0 +1,82 @@
+import json
+import threading
+from collections import Counter
+
+import redis
+
+# Replaces the stored maximum of a task when the new wait is longer or the stored one fell out of the window, and
+# returns whichever entry won, in one round trip and without racing other workers.
+RAISE_MAX_WAIT_SCRIPT = """
+local current = redis.call("HGET", KEYS[1], ARGV[1])
+if current then
+    local entry = cjson.decode(current)
+    if entry.at >= tonumber(ARGV[3]) and entry.seconds >= tonumber(ARGV[2]) then
+        return current
+    end
+end
+redis.call("HSET", KEYS[1], ARGV[1], ARGV[4])
+return ARGV[4]
+"""
+
+
+class LocalMetricStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._values = Counter()
+        self._max_waits = {}
+
+    def increment(self, values):
+        with self._lock:
+            self._values.update(values)
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def max_waits(self):
+        return dict(self._max_waits)
+
+    def raise_max_wait(self, task, entry, window_start):
+        with self._lock:
+            current = self._max_waits.get(task)
+            if current is None or current["at"] < window_start or current["seconds"] < entry["seconds"]:
+                self._max_waits[task] = current = entry
+            return current
+
+
+class RedisMetricStore:
+    # Shared by every worker process so a single scrape of /metrics sees all of them.
+    def __init__(self, url, stats_key, max_wait_key=None):
+        self._client = redis.Redis.from_url(url)
+        self._raise_max_wait = self._client.register_script(RAISE_MAX_WAIT_SCRIPT)
+        self.stats_key = stats_key
+        self.max_wait_key = max_wait_key
+
+    def reset(self):
+        self._client.delete(*filter(None, [self.stats_key, self.max_wait_key]))
+
+    def increment(self, values):
+        pipeline = self._client.pipeline(transaction=False)
+        for field, value in values.items():
+            pipeline.hincrbyfloat(self.stats_key, field, value)
+        pipeline.execute()
+
+    def values(self):
+        return {field.decode(): float(value) for field, value in self._client.hgetall(self.stats_key).items()}
+
+    def max_waits(self):
+        return {task.decode(): json.loads(entry) for task, entry in self._client.hgetall(self.max_wait_key).items()}
+
+    def raise_max_wait(self, task, entry, window_start):
+        winner = self._raise_max_wait(
+            keys=[self.max_wait_key], args=[task, entry["seconds"], window_start, json.dumps(entry)]
+        )
+        return json.loads(winner)
+
+
+def format_number(value):
+    # Redis returns every field as a float; keep whole counts readable.
+    return int(value) if float(value).is_integer() else value
@@ -0,0 +1,69 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .instrumentation import profile_request, registry, request_trace_id, use_trace_id, view_name
+
+logger = logging.getLogger(__name__)
+
+
+class InstrumentationMiddleware:
+    # Every request is timed, counted and given a trace id that follows the Celery tasks it enqueues; a sampled share
+    # is also profiled for queries and serializer time, which is reported in a Server-Timing header and a log line.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started, trace_id = time.perf_counter(), request_trace_id(request)
+        with use_trace_id(trace_id), profile_request(self._sampled()) as profile:
+            response = self.get_response(request)
+        return self._record(request, response, profile, trace_id, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        started, trace_id = time.perf_counter(), request_trace_id(request)
+        with use_trace_id(trace_id), profile_request(self._sampled()) as profile:
+            response = await self.get_response(request)
+        return self._record(request, response, profile, trace_id, time.perf_counter() - started)
+
+    def _sampled(self):
+        return random.random() < settings.INSTRUMENTATION_SAMPLE_RATE
+
+    def _record(self, request, response, profile, trace_id, duration):
+        response["X-Request-ID"] = trace_id
+        view = view_name(request)
+        registry.observe(view, request.method, response.status_code, duration, profile)
+        if profile is None:
+            return response
+
+        response["Server-Timing"] = profile.server_timing(duration)
+        statement, repeats = profile.most_duplicated()
+        logger.info(
+            json.dumps(
+                {
+                    "trace_id": trace_id,
+                    "view": view,
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code,
+                    "duration_ms": round(duration * 1000, 2),
+                    "db_queries": profile.queries,
+                    "db_ms": round(profile.query_time * 1000, 2),
+                    "duplicate_queries": profile.duplicate_queries,
+                    "most_duplicated": {"sql": statement[:500], "count": repeats} if statement else None,
+                    "serializer_ms": round(profile.serializer_time * 1000, 2),
+                }
+            )
+        )
+        return response
@@ -0,0 +1,9 @@
+from .instrumentation import get_trace_id
+from .models import OutboxTask
+
+
+def enqueue(task, *args, eta=None, **kwargs):
+    # The row is written in the caller's transaction; relay_outbox publishes it to the broker once committed.
+    return OutboxTask.objects.create(
+        task_name=task.name, args=list(args), kwargs=kwargs, eta=eta, trace_id=get_trace_id()
+    )
@@ -1,19 +1,33 @@
 from rest_framework.permissions import BasePermission
 
+from .utils import request_memo
+
+
+def is_attendee(request, obj):
+    return request_memo(request, ("is_attendee", obj._meta.label, obj.pk), lambda: obj.has_attendee(request.user))
+
+
+def is_owner(request, obj):
+    return request.user.is_authenticated and obj.owner_id == request.user.pk
+
+
+def is_self(request, obj):
+    return request.user.is_authenticated and obj.pk == request.user.pk
+
 
 class IsOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.owner == request.user
+        return is_owner(request, obj)
 
 
 class IsSelf(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj == request.user
+        return is_self(request, obj)
 
 
 class IsAttendee(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return request.user in obj.attendees.all()
+        return is_attendee(request, obj)
 
 
 class IsSuperUser(BasePermission):
@@ -23,4 +37,4 @@ class IsSuperUser(BasePermission):
 
 class IsSuperUserOrSelf(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return request.user.is_superuser or obj == request.user
+        return request.user.is_superuser or is_self(request, obj)
@@ -0,0 +1,11 @@
+from rest_framework.fields import empty
+
+from .instrumentation import time_serializer
+
+
+class TimedSerializerMixin:
+    def to_representation(self, instance):
+        return time_serializer(super().to_representation, instance)
+
+    def run_validation(self, data=empty):
+        return time_serializer(super().run_validation, data)
@@ -0,0 +1,187 @@
+import json
+import logging
+import time
+from contextlib import ExitStack
+from datetime import datetime
+
+import redis
+from django.conf import settings
+
+from .instrumentation import bucket_index, format_labels, get_trace_id, profile_request, render_histogram, use_trace_id
+from .metric_stores import LocalMetricStore, RedisMetricStore, format_number
+
+logger = logging.getLogger(__name__)
+
+TASK_DURATION_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+STATS_KEY = "meetmaster:task_metrics"
+MAX_WAIT_KEY = "meetmaster:task_metrics:max_queue_wait"
+COUNTERS = [
+    ("db_queries_total", "queries", "Database queries run by tasks."),
+    ("db_query_duration_seconds_total", "query_time", "Time tasks spent in database queries."),
+    ("emails_sent_total", "emails", "E-mails handed to the SMTP server by tasks."),
+]
+
+
+class TaskMetrics:
+    def __init__(self):
+        self._store = None
+        self._running = {}
+        self._max_waits = {}
+
+    @property
+    def store(self):
+        if self._store is None:
+            url = settings.TASK_METRICS_REDIS_URL
+            self._store = RedisMetricStore(url, STATS_KEY, MAX_WAIT_KEY) if url else LocalMetricStore()
+        return self._store
+
+    def reset(self):
+        self.store.reset()
+        self._max_waits.clear()
+
+    def stamp(self, headers=None, **kwargs):
+        # before_task_publish: every publish, including retries and outbox relays, restarts the queue wait clock.
+        headers["published_at"] = time.time()
+        if get_trace_id():
+            headers.setdefault("trace_id", get_trace_id())
+
+    def start(self, task_id=None, task=None, **kwargs):
+        now = time.time()
+        published_at = _header(task.request, "published_at")
+        eta = task.request.eta
+        if isinstance(eta, str):
+            eta = datetime.fromisoformat(eta)
+        # ETA and countdown tasks only start waiting in the queue once they are due.
+        queued_at = max(published_at or now, eta.timestamp() if eta else 0)
+        stack = ExitStack()
+        profile = stack.enter_context(profile_request())
+        stack.enter_context(use_trace_id(_header(task.request, "trace_id")))
+        self._running[task_id] = (stack, profile, time.perf_counter(), now - queued_at if published_at else None)
+
+    def finish(self, task_id=None, task=None, state=None, **kwargs):
+        running = self._running.pop(task_id, None)
+        if running is None:
+            return
+        stack, profile, started, queue_wait = running
+        runtime = time.perf_counter() - started
+        trace_id = get_trace_id()
+        stack.close()
+        self._log(task, state, trace_id, queue_wait, runtime, profile)
+        try:
+            self._observe(task.name, (state or "unknown").lower(), trace_id, queue_wait, runtime, profile)
+        except redis.RedisError:
+            logger.warning("Could not record metrics of %s", task.name, exc_info=True)
+
+    def _observe(self, name, state, trace_id, queue_wait, runtime, profile):
+        values = {
+            f"tasks|{name}|{state}": 1,
+            f"runtime_bucket|{name}|{bucket_index(TASK_DURATION_BUCKETS, runtime)}": 1,
+            f"runtime_sum|{name}|": runtime,
+            f"queries|{name}|": profile.queries,
+            f"query_time|{name}|": profile.query_time,
+            f"emails|{name}|": profile.emails,
+        }
+        if queue_wait is not None:
+            values[f"queue_wait_bucket|{name}|{bucket_index(TASK_DURATION_BUCKETS, queue_wait)}"] = 1
+            values[f"queue_wait_sum|{name}|"] = queue_wait
+            self._observe_max_wait(name, queue_wait, trace_id)
+        self.store.increment(values)
+
+    def _observe_max_wait(self, name, queue_wait, trace_id):
+        # Keeps the longest wait of the current window with the trace id of the request that enqueued the task, so a
+        # backlog can be traced to the request that caused it. The last maximum the store reported is remembered, so
+        # the store is only asked when this wait may beat it.
+        now = time.time()
+        known = self._max_waits.get(name)
+        if known is not None and _is_recent(known, now) and known["seconds"] >= queue_wait:
+            return
+        entry = {"seconds": queue_wait, "trace_id": trace_id, "at": now}
+        self._max_waits[name] = self.store.raise_max_wait(name, entry, now - settings.TASK_METRICS_MAX_WAIT_WINDOW)
+
+    def _log(self, task, state, trace_id, queue_wait, runtime, profile):
+        logger.info(
+            json.dumps(
+                {
+                    "trace_id": trace_id,
+                    "task": task.name,
+                    "task_id": task.request.id,
+                    "state": state,
+                    "retries": task.request.retries,
+                    "queue_wait_ms": round(queue_wait * 1000, 2) if queue_wait is not None else None,
+                    "runtime_ms": round(runtime * 1000, 2),
+                    "db_queries": profile.queries,
+                    "db_ms": round(profile.query_time * 1000, 2),
+                    "emails": profile.emails,
+                }
+            )
+        )
+
+    def render(self):
+        try:
+            values, max_waits = self.store.values(), self.store.max_waits()
+        except redis.RedisError:
+            logger.warning("Could not read task metrics", exc_info=True)
+            return ""
+
+        series = {}
+        for field, value in values.items():
+            metric, name, extra = field.split("|")
+            series.setdefault(metric, {}).setdefault(name, {})[extra] = value
+
+        lines = [
+            "# HELP meetmaster_celery_tasks_total Tasks run, by task and final state (success, retry or failure).",
+            "# TYPE meetmaster_celery_tasks_total counter",
+        ]
+        for name, states in sorted(series.get("tasks", {}).items()):
+            for state, count in sorted(states.items()):
+                lines.append(
+                    f"meetmaster_celery_tasks_total{format_labels(task=name, state=state)} {format_number(count)}"
+                )
+
+        for metric, description in [
+            ("queue_wait", "Time tasks waited in the broker before a worker started them."),
+            ("runtime", "Time spent running tasks."),
+        ]:
+            lines += render_histogram(
+                f"meetmaster_celery_task_{metric}_seconds",
+                description,
+                TASK_DURATION_BUCKETS,
+                [
+                    (
+                        {"task": name},
+                        [int(buckets.get(str(i), 0)) for i in range(len(TASK_DURATION_BUCKETS) + 1)],
+                        series[f"{metric}_sum"][name][""],
+                    )
+                    for name, buckets in sorted(series.get(f"{metric}_bucket", {}).items())
+                ],
+            )
+
+        for metric, key, description in COUNTERS:
+            name = f"meetmaster_celery_task_{metric}"
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+            for task, value in sorted(series.get(key, {}).items()):
+                lines.append(f"{name}{format_labels(task=task)} {format_number(value[''])}")
+
+        lines += [
+            "# HELP meetmaster_celery_task_max_queue_wait_seconds Longest recent queue wait, by task and trace id.",
+            "# TYPE meetmaster_celery_task_max_queue_wait_seconds gauge",
+        ]
+        now = time.time()
+        for name, entry in sorted(max_waits.items()):
+            if not _is_recent(entry, now):
+                continue
+            labels = format_labels(task=name, trace_id=entry["trace_id"])
+            lines.append(f"meetmaster_celery_task_max_queue_wait_seconds{labels} {entry['seconds']}")
+        return "\n".join(lines) + "\n"
+
+
+def _is_recent(entry, now):
+    return entry["at"] >= now - settings.TASK_METRICS_MAX_WAIT_WINDOW
+
+
+def _header(request, name):
+    # Worker requests expose custom message headers as attributes, eager ones only under request.headers.
+    return getattr(request, name, None) or (request.headers or {}).get(name)
+
+
+task_metrics = TaskMetrics()
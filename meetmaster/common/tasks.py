@@ -0,0 +1,24 @@
+from celery import current_app, shared_task
+from django.db import transaction
+
+from .models import OutboxTask
+
+
+@shared_task
+def relay_outbox(batch_size=500):
+    relayed = 0
+    while True:
+        with transaction.atomic():
+            batch = list(OutboxTask.objects.order_by("id").select_for_update(skip_locked=True)[:batch_size])
+            for outbox_task in batch:
+                current_app.send_task(
+                    outbox_task.task_name,
+                    args=outbox_task.args,
+                    kwargs=outbox_task.kwargs,
+                    eta=outbox_task.eta,
+                    headers={"trace_id": outbox_task.trace_id},
+                )
+            OutboxTask.objects.filter(id__in=[outbox_task.id for outbox_task in batch]).delete()
+        relayed += len(batch)
+        if len(batch) < batch_size:
+            return relayed
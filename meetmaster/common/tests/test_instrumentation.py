@@ -0,0 +1,148 @@
+import json
+import logging
+from unittest.mock import patch
+
+import pytest
+import redis
+from asgiref.sync import async_to_sync
+from common.instrumentation import MetricsRegistry, profile_request, registry
+from common.metric_stores import LocalMetricStore
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import AsyncClient
+from django.urls import reverse
+from django.utils import timezone
+from events.models import Event
+from rest_framework.test import APIClient
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture(autouse=True)
+def reset_registry():
+    registry.reset()
+
+
+@pytest.fixture
+def create_event():
+    owner = get_user_model().objects.create_user(username="user1", email="email1@mail.com", password="password")
+    return Event.objects.create(
+        title="Event 1",
+        description="Description for event 1",
+        date=timezone.now() + timezone.timedelta(days=1),
+        location="Location 1",
+        owner=owner,
+    )
+
+
+def server_timing(response):
+    return {
+        name: params
+        for name, *params in (metric.strip().split(";", 1) for metric in response["Server-Timing"].split(","))
+    }
+
+
+@pytest.mark.django_db
+def test_duplicate_statements_are_counted_without_parameters():
+    with profile_request() as profile:
+        with connection.cursor() as cursor:
+            for value in range(3):
+                cursor.execute("SELECT %s", [value])
+            cursor.execute("SELECT 1")
+
+    assert profile.queries == 4
+    assert profile.duplicate_queries == 2
+    assert profile.most_duplicated() == ("SELECT %s", 3)
+
+
+@pytest.mark.django_db
+def test_sampled_request_reports_server_timing_and_log(api_client, create_event, settings, caplog):
+    settings.INSTRUMENTATION_SAMPLE_RATE = 1
+
+    with caplog.at_level(logging.INFO, logger="common.middleware"):
+        response = api_client.get(reverse("event-detail", kwargs={"pk": create_event.pk}))
+
+    timing = server_timing(response)
+    assert set(timing) == {"app", "db", "serializer"}
+    assert 'desc="queries=1 duplicates=0"' in timing["db"][0]
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record["view"] == "EventViewSet.retrieve"
+    assert record["status"] == 200
+    assert record["db_queries"] == 1
+    assert record["serializer_ms"] > 0
+
+
+@pytest.mark.django_db
+def test_unsampled_request_is_only_counted(api_client, create_event, settings):
+    settings.INSTRUMENTATION_SAMPLE_RATE = 0
+
+    response = api_client.get(reverse("event-attendees", kwargs={"pk": create_event.pk}))
+
+    assert "Server-Timing" not in response
+    rendered = registry.render()
+    assert 'meetmaster_http_requests_total{view="EventViewSet.attendees",method="GET",status="403"} 1' in rendered
+    assert 'meetmaster_db_queries_total{view="EventViewSet.attendees"}' not in rendered
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_views_are_profiled(create_event, settings):
+    settings.INSTRUMENTATION_SAMPLE_RATE = 1
+
+    response = async_to_sync(AsyncClient().get)(reverse("async-event-list"))
+
+    assert response.status_code == 200
+    assert "queries=1 " in server_timing(response)["db"][0]
+    assert 'meetmaster_db_queries_total{view="events.async_views.event_list"} 1' in registry.render()
+
+
+def test_workers_report_each_others_requests_through_the_shared_store(settings):
+    settings.METRICS_FLUSH_INTERVAL = 60
+    store = LocalMetricStore()
+    workers = [MetricsRegistry(), MetricsRegistry()]
+    for worker in workers:
+        worker._store = store
+        worker.observe("EventViewSet.list", "GET", 200, 0.02)
+
+    # A scrape flushes the worker answering it; the other one flushed with a later request.
+    workers[0].flush()
+    for worker in reversed(workers):
+        assert 'meetmaster_http_requests_total{view="EventViewSet.list",method="GET",status="200"} 2' in worker.render()
+
+
+def test_counts_are_kept_while_the_store_is_unavailable(settings):
+    settings.METRICS_FLUSH_INTERVAL = 0
+    worker = MetricsRegistry()
+    worker._store = LocalMetricStore()
+
+    with patch.object(worker._store, "increment", side_effect=redis.ConnectionError):
+        worker.observe("EventViewSet.list", "GET", 200, 0.02)
+    worker.observe("EventViewSet.list", "GET", 200, 0.02)
+
+    assert 'meetmaster_http_request_duration_seconds_count{view="EventViewSet.list"} 2' in worker.render()
+
+
+@pytest.mark.django_db
+def test_metrics_requires_token(api_client, create_event, settings):
+    settings.METRICS_TOKEN = "secret"
+    settings.INSTRUMENTATION_SAMPLE_RATE = 1
+    api_client.get(reverse("event-detail", kwargs={"pk": create_event.pk}))
+
+    assert api_client.get(reverse("metrics")).status_code == 401
+
+    response = api_client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret")
+    assert response.status_code == 200
+    assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+    body = response.content.decode()
+    assert 'meetmaster_http_request_duration_seconds_count{view="EventViewSet.retrieve"} 1' in body
+    assert 'meetmaster_db_queries_total{view="EventViewSet.retrieve"} 1' in body
+
+
+@pytest.mark.django_db
+def test_metrics_is_hidden_without_token_in_production(api_client, settings):
+    settings.METRICS_TOKEN = ""
+    settings.DEBUG = False
+
+    assert api_client.get(reverse("metrics")).status_code == 404
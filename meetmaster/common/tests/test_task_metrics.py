@@ -0,0 +1,107 @@
+import json
+import logging
+import time
+from unittest.mock import patch
+
+import pytest
+from common.instrumentation import get_trace_id, use_trace_id
+from common.task_metrics import task_metrics
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from events.models import Event, Notification, NotificationDelivery, PendingNotification
+from events.tasks import flush_pending_notifications, send_notification_chunk
+from rest_framework.test import APIClient
+
+
+@pytest.fixture(autouse=True)
+def reset_store():
+    task_metrics.reset()
+
+
+@pytest.fixture
+def event():
+    owner = get_user_model().objects.create_user(username="user1", email="user1@example.com", password="password")
+    return Event.objects.create(
+        title="Event 1",
+        description="Description for event 1",
+        date=timezone.now() + timezone.timedelta(days=1),
+        location="Location 1",
+        owner=owner,
+    )
+
+
+def test_published_tasks_carry_the_current_trace_id():
+    headers = {}
+    with use_trace_id("request-1"):
+        task_metrics.stamp(headers=headers)
+
+    assert headers["trace_id"] == "request-1"
+    assert headers["published_at"] <= time.time()
+
+
+@pytest.mark.django_db
+def test_task_run_records_metrics_under_its_trace_id(event, caplog):
+    notification = Notification.objects.create(event=event, subject="Subject", message="Message")
+    delivery = NotificationDelivery.objects.create(notification=notification, recipient=event.owner)
+
+    with caplog.at_level(logging.INFO, logger="common.task_metrics"):
+        send_notification_chunk.apply(
+            args=[[delivery.id]], headers={"trace_id": "request-1", "published_at": time.time() - 2}
+        )
+
+    task = 'task="events.tasks.send_notification_chunk"'
+    rendered = task_metrics.render()
+    assert f'meetmaster_celery_tasks_total{{{task},state="success"}} 1' in rendered
+    assert f"meetmaster_celery_task_emails_sent_total{{{task}}} 1" in rendered
+    assert f"meetmaster_celery_task_db_queries_total{{{task}}} 3" in rendered
+    assert f'meetmaster_celery_task_queue_wait_seconds_bucket{{{task},le="1.0"}} 0' in rendered
+    assert f'meetmaster_celery_task_queue_wait_seconds_bucket{{{task},le="5.0"}} 1' in rendered
+    assert f'meetmaster_celery_task_max_queue_wait_seconds{{{task},trace_id="request-1"}} 2.' in rendered
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record["trace_id"] == "request-1"
+    assert record["state"] == "SUCCESS"
+    assert get_trace_id() == ""
+
+
+def test_max_queue_wait_only_reaches_the_store_when_it_may_be_a_new_maximum():
+    store = task_metrics.store
+    # Another worker already recorded a longer wait.
+    store.raise_max_wait("task", {"seconds": 5.0, "trace_id": "request-1", "at": time.time()}, 0)
+
+    with patch.object(store, "raise_max_wait", wraps=store.raise_max_wait) as raise_max_wait:
+        task_metrics._observe_max_wait("task", 3.0, "request-2")
+        task_metrics._observe_max_wait("task", 4.0, "request-3")
+        task_metrics._observe_max_wait("task", 6.0, "request-4")
+
+    assert raise_max_wait.call_count == 2
+    assert store.max_waits()["task"]["trace_id"] == "request-4"
+
+
+@pytest.mark.django_db
+def test_request_trace_id_is_stored_with_queued_notifications(event):
+    client = APIClient()
+    client.force_authenticate(get_user_model().objects.create_user(username="user2", email="user2@example.com"))
+
+    response = client.post(reverse("event-attende", kwargs={"pk": event.pk}), HTTP_X_REQUEST_ID="request-1")
+
+    assert response["X-Request-ID"] == "request-1"
+    assert PendingNotification.objects.get().trace_id == "request-1"
+
+    response = client.post(reverse("event-remove-attendee", kwargs={"pk": event.pk}), HTTP_X_REQUEST_ID="bad id")
+    assert len(response["X-Request-ID"]) == 32
+    assert PendingNotification.objects.get().trace_id == response["X-Request-ID"]
+
+
+@pytest.mark.django_db
+@patch("events.tasks.send_notification_to_all_attendees.delay")
+def test_flushed_notifications_are_sent_under_the_queuing_trace_id(mock_delay, event):
+    PendingNotification.objects.create(
+        event=event, subject="Canceled", message="Event canceled", due_at=timezone.now(), trace_id="request-1"
+    )
+    trace_ids = []
+    mock_delay.side_effect = lambda *args: trace_ids.append(get_trace_id())
+
+    flush_pending_notifications()
+
+    assert trace_ids == ["request-1"]
@@ -0,0 +1,43 @@
+from unittest.mock import call, patch
+
+import pytest
+from common.instrumentation import use_trace_id
+from common.models import OutboxTask
+from common.outbox import enqueue
+from common.tasks import relay_outbox
+from django.utils import timezone
+from events.tasks import finish_event, retry_failed_deliveries
+
+
+@pytest.mark.django_db
+@patch("common.tasks.current_app.send_task")
+def test_relay_outbox_publishes_and_removes_queued_tasks(mock_send_task):
+    eta = timezone.now() + timezone.timedelta(minutes=5)
+    with use_trace_id("request-1"):
+        enqueue(finish_event, 1, eta=eta)
+    enqueue(retry_failed_deliveries, 2, chunk_size=10)
+
+    assert relay_outbox(batch_size=1) == 2
+
+    assert mock_send_task.call_args_list == [
+        call("events.tasks.finish_event", args=[1], kwargs={}, eta=eta, headers={"trace_id": "request-1"}),
+        call(
+            "events.tasks.retry_failed_deliveries",
+            args=[2],
+            kwargs={"chunk_size": 10},
+            eta=None,
+            headers={"trace_id": ""},
+        ),
+    ]
+    assert not OutboxTask.objects.exists()
+
+
+@pytest.mark.django_db
+@patch("common.tasks.current_app.send_task", side_effect=ConnectionError)
+def test_relay_outbox_keeps_tasks_when_broker_is_unavailable(mock_send_task):
+    enqueue(finish_event, 1)
+
+    with pytest.raises(ConnectionError):
+        relay_outbox()
+
+    assert OutboxTask.objects.count() == 1
@@ -1,4 +1,41 @@
+from contextlib import contextmanager
+from hashlib import sha256
+from itertools import islice
+
+from django.db import connection
+
+
 def model_data_prop_was_changed(instance, validated_data, key):
     if key in validated_data:
         return getattr(instance, key) != validated_data[key]
     return False
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def request_memo(request, key, compute):
+    memo = request.__dict__.setdefault("_request_memo", {})
+    if key not in memo:
+        memo[key] = compute()
+    return memo[key]
+
+
+@contextmanager
+def advisory_lock(name):
+    # A session-level Postgres advisory lock: one holder across every worker and host sharing the database, only ever
+    # released by its holder, and dropped by the server if that connection dies. Transaction-level locks would not
+    # cover jobs that commit in batches.
+    lock_id = int.from_bytes(sha256(name.encode()).digest()[:8], "big", signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [lock_id])
+        acquired = cursor.fetchone()[0]
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_id])
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+
+from .instrumentation import registry
+from .task_metrics import task_metrics
+from .utils import request_memo
+
+
+class CachedObjectMixin:
+    # get_object is called by permissions, serializer selection and the action itself; resolve it once per request.
+    def get_object(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        key = ("object", type(self).__name__, self.kwargs.get(lookup_url_kwarg))
+        return request_memo(self.request, key, super().get_object)
+
+
+def metrics(request):
+    # Request and task metrics come from shared stores when METRICS_REDIS_URL and TASK_METRICS_REDIS_URL are set.
+    # Scrapers authenticate with METRICS_TOKEN; without one the endpoint is only exposed in development.
+    if settings.METRICS_TOKEN:
+        if not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        raise Http404
+    return HttpResponse(
+        registry.render() + task_metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -5,7 +5,7 @@ from .models import Event
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = [field.name for field in Event._meta.fields]
+    list_display = [field.name for field in Event._meta.fields if field.name != "search_vector"]
     list_filter = [
         "status",
         "created",
@@ -0,0 +1,88 @@
+from common.authentication import SignedTokenAuthentication
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import AuthenticationFailed, NotFound, ValidationError
+from rest_framework.request import Request
+
+from .changes import stream_changes
+from .filters import filter_events
+from .models import Event
+from .pagination import AttendeeCursorPagination, EventCursorPagination
+from .serializers import EventSerializer
+
+
+async def _get_user(request):
+    # Bearer tokens are checked first so API clients do not need a session; the lookup is cached.
+    authenticated = await SignedTokenAuthentication().aauthenticate(request)
+    if authenticated is not None:
+        return authenticated[0]
+    return await request.auser()
+
+
+@require_GET
+async def event_list(request):
+    # The paginator of EventViewSet.list, so both endpoints share ordering, cursors and response shape.
+    paginator = EventCursorPagination()
+    try:
+        events = filter_events(Event.objects.all(), request.GET)
+        page = await paginator.apaginate_queryset(events, Request(request))
+    except ValidationError as exc:
+        return JsonResponse(exc.detail, status=400)
+    except NotFound as exc:
+        return JsonResponse({"detail": exc.detail}, status=404)
+    return JsonResponse(paginator.get_paginated_response(EventSerializer(page, many=True).data).data)
+
+
+@require_GET
+async def event_detail(request, pk):
+    try:
+        event = await Event.objects.aget(pk=pk)
+    except Event.DoesNotExist:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    return JsonResponse(EventSerializer(event).data)
+
+
+@require_GET
+async def event_attendees(request, pk):
+    try:
+        user = await _get_user(request)
+    except AuthenticationFailed as exc:
+        return JsonResponse({"detail": exc.detail}, status=401)
+    if not user.is_authenticated:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=403)
+
+    try:
+        event = await Event.objects.aget(pk=pk)
+    except Event.DoesNotExist:
+        return JsonResponse({"detail": "Not found."}, status=404)
+    if event.owner_id != user.pk and not await event.ahas_attendee(user):
+        return JsonResponse({"detail": "Not authorized to view attendee details"}, status=403)
+
+    # The paginator of EventViewSet.attendees, so both endpoints share ordering, cursors and response shape.
+    paginator = AttendeeCursorPagination()
+    attendees = event.attendees.values("id", "username")
+    try:
+        page = await paginator.apaginate_queryset(attendees, Request(request))
+    except NotFound as exc:
+        return JsonResponse({"detail": exc.detail}, status=404)
+    return JsonResponse(paginator.get_paginated_response(page).data)
+
+
+@require_GET
+async def event_changes(request):
+    # A stream stays open for as long as the client listens. Under WSGI it would pin a worker thread for good, so only
+    # the ASGI service serves it.
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({"detail": "The change stream is only served by the ASGI service."}, status=404)
+
+    last_event_id = request.headers.get("Last-Event-ID", request.GET.get("last_event_id"))
+    event_ids = request.GET.getlist("event")
+    if (last_event_id is not None and not last_event_id.isdigit()) or not all(map(str.isdigit, event_ids)):
+        return JsonResponse({"detail": "Invalid last event id or event filter."}, status=400)
+
+    last_id = int(last_event_id) if last_event_id is not None else None
+    response = StreamingHttpResponse(stream_changes(last_id, event_ids), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,70 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+
+GENERATION_KEY = "events:generation"
+LIST_VERSION_KEY = "events:version:list"
+HITS_KEY = "events:stats:hits"
+MISSES_KEY = "events:stats:misses"
+
+
+def _event_version_key(event_id):
+    return f"events:version:{event_id}"
+
+
+def _viewer_scope(request):
+    return "user" if request.user.is_authenticated else "anon"
+
+
+def _params_digest(request):
+    return md5(request.query_params.urlencode().encode(), usedforsecurity=False).hexdigest()
+
+
+def _bump(key):
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def list_cache_key(request):
+    versions = cache.get_many([GENERATION_KEY, LIST_VERSION_KEY])
+    generation, version = versions.get(GENERATION_KEY, 0), versions.get(LIST_VERSION_KEY, 0)
+    return f"events:list:{generation}.{version}:{_viewer_scope(request)}:{_params_digest(request)}"
+
+
+def detail_cache_key(request, event_id):
+    # "01" and "1" resolve to the same event, so they must share the version bumped by invalidate_event.
+    event_id = int(event_id)
+    version_key = _event_version_key(event_id)
+    versions = cache.get_many([GENERATION_KEY, version_key])
+    generation, version = versions.get(GENERATION_KEY, 0), versions.get(version_key, 0)
+    return f"events:detail:{event_id}:{generation}.{version}:{_viewer_scope(request)}:{_params_digest(request)}"
+
+
+def get_cached(key):
+    data = cache.get(key)
+    _bump(MISSES_KEY if data is None else HITS_KEY)
+    return data
+
+
+def set_cached(key, data):
+    cache.set(key, data, settings.EVENT_CACHE_TTL)
+
+
+def invalidate_event(event_id):
+    _bump(_event_version_key(event_id))
+    _bump(LIST_VERSION_KEY)
+
+
+def invalidate_all_events():
+    _bump(GENERATION_KEY)
+
+
+def cache_stats():
+    stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = stats.get(HITS_KEY, 0), stats.get(MISSES_KEY, 0)
+    lookups = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": hits / lookups if lookups else None}
@@ -0,0 +1,218 @@
+import asyncio
+import contextvars
+import json
+import logging
+
+import psycopg
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, connections, transaction
+from django.utils import timezone
+
+from .models import EventChange
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "events_changes"
+
+
+def publish_event_change(event_id, kind, data=None):
+    return publish_event_changes([EventChange(event_id=event_id, kind=kind, data=data or {})])
+
+
+def publish_event_changes(changes):
+    # Rows are part of the caller's transaction, so subscribers only see committed changes and can replay anything
+    # they missed from the table. The NOTIFY is sent after the commit: inside the transaction it would hold Postgres'
+    # global notification lock until the commit and serialize every transaction that publishes a change.
+    changes = EventChange.objects.bulk_create(changes, batch_size=1000)
+    if changes:
+        last_id = changes[-1].id
+        transaction.on_commit(lambda: notify_subscribers(last_id))
+    return changes
+
+
+def notify_subscribers(last_id):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, str(last_id)])
+
+
+def format_change(change):
+    payload = {
+        "event_id": change.event_id,
+        "kind": change.kind,
+        "data": change.data,
+        "created": change.created,
+    }
+    return f"id: {change.id}\nevent: {change.kind}\ndata: {json.dumps(payload, cls=DjangoJSONEncoder)}\n\n"
+
+
+class Subscription:
+    def __init__(self, event_ids=None):
+        self.event_ids = {int(event_id) for event_id in event_ids} if event_ids else None
+        self.queue = asyncio.Queue(maxsize=settings.EVENT_CHANGES_SUBSCRIBER_BUFFER)
+        self.overflowed = False
+
+    def wants(self, change):
+        return self.event_ids is None or change.event_id in self.event_ids
+
+
+class ChangeListener:
+    # One LISTEN connection per process. Every NOTIFY wakes a single poller, which reads the new changes once and fans
+    # them out to the subscribers' queues, so streams make no queries of their own after replaying their backlog.
+    def __init__(self):
+        self.last_id = None
+        self._seen = {}
+        self._subscribers = set()
+        self._wakeup = None
+        self._ready = None
+        self._tasks = []
+        self._loop = None
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or any(task.done() for task in self._tasks):
+            self._loop = loop
+            self._subscribers = set()
+            self._wakeup = asyncio.Event()
+            self._ready = loop.create_future()
+            self._tasks = [self._detach(self._listen()), self._detach(self._poll_forever())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def subscribe(self, event_ids=None):
+        # Returns the position the subscription starts after; older changes are read with replay().
+        self.start()
+        await asyncio.shield(self._ready)
+        subscription = Subscription(event_ids)
+        self._subscribers.add(subscription)
+        return subscription, self.last_id
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    async def replay(self, subscription, after_id, until_id):
+        # A page of the changes a subscription missed before it started.
+        changes = EventChange.objects.filter(id__gt=after_id, id__lte=until_id).order_by("id")
+        if subscription.event_ids is not None:
+            changes = changes.filter(event_id__in=subscription.event_ids)
+        return await self._detach(self._fetch(changes[: settings.EVENT_CHANGES_BATCH_SIZE]))
+
+    def _detach(self, coro):
+        # Tasks run in an empty context instead of the request's, so the async ORM sends their queries through one
+        # shared thread and connection per process rather than holding one per open stream.
+        return self._loop.create_task(coro, context=contextvars.Context())
+
+    async def _fetch(self, changes):
+        try:
+            return [change async for change in changes]
+        except DatabaseError:
+            await sync_to_async(connection.close)()
+            raise
+
+    async def _listen(self):
+        params = connections["default"].get_connection_params()
+        params.pop("cursor_factory", None)
+        params.pop("context", None)
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(**params, autocommit=True) as conn:
+                    await conn.execute(f"LISTEN {CHANNEL}")
+                    # Changes committed while the connection was down were never notified.
+                    self._wakeup.set()
+                    async for _ in conn.notifies():
+                        self._wakeup.set()
+            except psycopg.Error:
+                logger.exception("Event change listener lost its connection")
+                await asyncio.sleep(settings.EVENT_CHANGES_RECONNECT_DELAY)
+
+    async def _poll_forever(self):
+        latest = await EventChange.objects.order_by("-id").values_list("id", flat=True).afirst()
+        self.last_id = latest or 0
+        recent = EventChange.objects.filter(created__gte=_commit_lag_start()).values_list("id", "created")
+        self._seen = {change_id: created async for change_id, created in recent}
+        self._ready.set_result(None)
+
+        while True:
+            # Bursts of notifications collapse into one poll; the timeout picks up changes whose NOTIFY was lost.
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), settings.EVENT_CHANGES_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self._poll()
+            except DatabaseError:
+                logger.exception("Event change listener failed to read changes")
+                await asyncio.sleep(settings.EVENT_CHANGES_RECONNECT_DELAY)
+
+    async def _poll(self):
+        # Ids are handed out on insert, not on commit, so a transaction that started earlier can commit a lower id
+        # after the listener moved past it. Changes created within the commit lag are read again and those already
+        # dispatched skipped.
+        since = _commit_lag_start()
+        self._seen = {change_id: created for change_id, created in self._seen.items() if created >= since}
+        late = EventChange.objects.filter(id__lte=self.last_id, created__gte=since).exclude(id__in=list(self._seen))
+        changes = await self._fetch(late.order_by("id"))
+        while True:
+            page = EventChange.objects.filter(id__gt=self.last_id).order_by("id")[: settings.EVENT_CHANGES_BATCH_SIZE]
+            page = await self._fetch(page)
+            self._dispatch(changes + page)
+            if len(page) < settings.EVENT_CHANGES_BATCH_SIZE:
+                return
+            changes = []
+
+    def _dispatch(self, changes):
+        # Runs without awaiting, so a subscription added meanwhile gets exactly the changes after its start position.
+        for change in changes:
+            self.last_id = max(self.last_id, change.id)
+            self._seen[change.id] = change.created
+            for subscription in list(self._subscribers):
+                if not subscription.wants(change):
+                    continue
+                try:
+                    subscription.queue.put_nowait(change)
+                except asyncio.QueueFull:
+                    subscription.overflowed = True
+                    self.unsubscribe(subscription)
+
+
+listener = ChangeListener()
+
+
+async def stream_changes(last_id, event_ids=None):
+    # A client resuming from Last-Event-ID may get a change committed late within the commit lag twice and should
+    # ignore ids it has seen. A client that falls EVENT_CHANGES_SUBSCRIBER_BUFFER changes behind is disconnected and
+    # replays from its Last-Event-ID when the EventSource reconnects.
+    subscription, position = await listener.subscribe(event_ids)
+    try:
+        replayed = set()
+        while last_id is not None and last_id < position:
+            page = await listener.replay(subscription, last_id, position)
+            if not page:
+                break
+            for change in page:
+                last_id = change.id
+                replayed.add(change.id)
+                yield format_change(change)
+
+        while True:
+            if subscription.overflowed and subscription.queue.empty():
+                return
+            try:
+                change = await asyncio.wait_for(subscription.queue.get(), settings.EVENT_CHANGES_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if change.id not in replayed:
+                yield format_change(change)
+    finally:
+        listener.unsubscribe(subscription)
+
+
+def _commit_lag_start():
+    return timezone.now() - timezone.timedelta(seconds=settings.EVENT_CHANGES_COMMIT_LAG)
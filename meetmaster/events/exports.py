@@ -0,0 +1,74 @@
+import csv
+import json
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+
+EVENT_EXPORT_FIELDS = [
+    "id",
+    "title",
+    "description",
+    "date",
+    "location",
+    "status",
+    "capacity",
+    "attendee_count",
+    "owner_id",
+    "created",
+    "updated",
+]
+ATTENDEE_EXPORT_FIELDS = ["id", "username"]
+
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+class ExportSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=list(CONTENT_TYPES), default="csv")
+    background = serializers.BooleanField(default=False)
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def event_rows(queryset):
+    return queryset.order_by("id").values(*EVENT_EXPORT_FIELDS).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def attendee_rows(event):
+    queryset = event.attendees.order_by("id").values(*ATTENDEE_EXPORT_FIELDS)
+    return queryset.iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def render_rows(rows, fields, export_type):
+    if export_type == "csv":
+        writer = csv.writer(_Echo())
+        yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow([row[field] for field in fields])
+    else:
+        for row in rows:
+            yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+def streaming_export(rows, fields, export_type, filename):
+    response = StreamingHttpResponse(render_rows(rows, fields, export_type), content_type=CONTENT_TYPES[export_type])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{export_type}"'
+    return response
+
+
+def write_export(rows, fields, export_type, path):
+    with tempfile.TemporaryFile("w+", encoding="utf-8", newline="") as file:
+        file.writelines(render_rows(rows, fields, export_type))
+        file.seek(0)
+        return default_storage.save(path, File(file))
+
+
+def export_path(name, export_type):
+    return f"{settings.EXPORTS_DIR}/{name}.{export_type}"
@@ -0,0 +1,43 @@
+from django.contrib.postgres.search import SearchQuery
+from rest_framework import serializers
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Event
+
+
+class EventFilterSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Event.Status.choices, required=False)
+    date_after = serializers.DateTimeField(required=False)
+    date_before = serializers.DateTimeField(required=False)
+    location = serializers.CharField(max_length=200, required=False)
+    owner = serializers.IntegerField(min_value=1, required=False)
+    search = serializers.CharField(max_length=200, required=False)
+
+
+def filter_events(queryset, params):
+    serializer = EventFilterSerializer(data=params)
+    serializer.is_valid(raise_exception=True)
+    filters = serializer.validated_data
+
+    if "status" in filters:
+        queryset = queryset.filter(status=filters["status"])
+    if "date_after" in filters:
+        queryset = queryset.filter(date__gte=filters["date_after"])
+    if "date_before" in filters:
+        queryset = queryset.filter(date__lte=filters["date_before"])
+    if "location" in filters:
+        queryset = queryset.filter(location__icontains=filters["location"])
+    if "owner" in filters:
+        queryset = queryset.filter(owner_id=filters["owner"])
+    if "search" in filters:
+        queryset = queryset.filter(
+            search_vector=SearchQuery(filters["search"], config="english", search_type="websearch")
+        )
+    return queryset
+
+
+class EventFilterBackend(BaseFilterBackend):
+    def filter_queryset(self, request, queryset, view):
+        if view.action not in ["list", "export"]:
+            return queryset
+        return filter_events(queryset, request.query_params)
@@ -0,0 +1,315 @@
+import argparse
+import os
+import resource
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import redis
+from celery.contrib.testing.worker import start_worker
+from celery.signals import task_postrun, task_prerun, worker_ready
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.utils import timezone
+from events.management.commands.loadtest import percentile
+from events.models import Event
+from events.tasks import send_notification_to_all_attendees
+
+from meetmaster.celery import app
+
+User = get_user_model()
+
+IN_PROCESS_POOLS = ["solo", "threads"]
+STATS_KEY = "benchmark:notifications"
+_task_queries = threading.local()
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self._reply("220 meetmaster-benchmark ESMTP")
+        while line := self.rfile.readline():
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self._reply("250 meetmaster-benchmark")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                self.server.sink.record()
+                self._reply("250 OK")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("250 OK")
+
+    def _reply(self, message):
+        self.wfile.write(f"{message}\r\n".encode())
+
+
+class SMTPSink:
+    # Accepts and discards mail, remembering when each message arrived.
+    def __init__(self):
+        self.timestamps = []
+        self._lock = threading.Lock()
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+        self._server.daemon_threads = True
+        self._server.sink = self
+        self.port = self._server.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def record(self):
+        with self._lock:
+            self.timestamps.append(time.time())
+
+    def wait_for(self, count, timeout):
+        deadline = time.monotonic() + timeout
+        while len(self.timestamps) < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return len(self.timestamps) >= count
+
+
+class LocalStats:
+    def __init__(self):
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name, value):
+        with self._lock:
+            self._values[name] += value
+
+    def maximum(self, name, value):
+        with self._lock:
+            self._values[name] = max(self._values[name], value)
+
+    def read(self):
+        return dict(self._values)
+
+    def reset(self):
+        self._values.clear()
+
+
+class RedisStats:
+    # Shared by the prefork children of an out-of-process worker.
+    def __init__(self, url):
+        self._client = redis.Redis.from_url(url)
+
+    def add(self, name, value):
+        self._client.hincrby(STATS_KEY, name, value)
+
+    def maximum(self, name, value):
+        self._client.hset(STATS_KEY, f"{name}:{os.getpid()}", value)
+
+    def read(self):
+        values = Counter()
+        for key, value in self._client.hgetall(STATS_KEY).items():
+            name, _, pid = key.decode().partition(":")
+            values[name] = max(values[name], int(value)) if pid else int(value)
+        return dict(values)
+
+    def reset(self):
+        self._client.delete(STATS_KEY)
+
+
+def _count_query(execute, sql, params, many, context):
+    _task_queries.count = getattr(_task_queries, "count", 0) + 1
+    return execute(sql, params, many, context)
+
+
+def install_task_probes(stats):
+    def add_query_counter(sender, connection, **kwargs):
+        # Fires again whenever the worker reconnects, which Celery does after each task without persistent connections.
+        if _count_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_count_query)
+
+    def before_task(**kwargs):
+        _task_queries.count = 0
+
+    def after_task(**kwargs):
+        stats.add("queries", _task_queries.count)
+        stats.add("tasks", 1)
+        stats.maximum("maxrss", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+    connection_created.connect(add_query_counter, weak=False)
+    task_prerun.connect(before_task, weak=False)
+    task_postrun.connect(after_task, weak=False)
+
+
+@contextmanager
+def use_broker(url):
+    # Points the shared app at another broker, dropping pooled connections to the previous one on the way in and out.
+    # Celery reads CELERY_BROKER_URL from the environment before its own configuration, so both are swapped.
+    previous_url, previous_env = app.conf.broker_url, os.environ.get("CELERY_BROKER_URL")
+    app.conf.broker_url = os.environ["CELERY_BROKER_URL"] = url
+    app.close()
+    try:
+        yield
+    finally:
+        app.conf.broker_url = previous_url
+        if previous_env is None:
+            del os.environ["CELERY_BROKER_URL"]
+        else:
+            os.environ["CELERY_BROKER_URL"] = previous_env
+        app.close()
+
+
+class Command(BaseCommand):
+    help = "Measure notification e-mail throughput and latency against a local fake SMTP server."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--attendees", type=int, default=10_000)
+        parser.add_argument("--concurrency", default="1,4", help="Comma separated worker pool sizes to compare.")
+        parser.add_argument("--pool", default="threads", help="solo, threads, prefork, gevent or eventlet.")
+        parser.add_argument(
+            "--broker", help="Redis broker URL for an out-of-process worker; required by prefork, gevent and eventlet."
+        )
+        parser.add_argument("--chunk-size", type=int, default=settings.NOTIFICATION_CHUNK_SIZE)
+        parser.add_argument("--timeout", type=float, default=600)
+        parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options["worker"]:
+            return self._run_worker(options)
+        if options["pool"] not in IN_PROCESS_POOLS and not options["broker"]:
+            raise CommandError(f"The {options['pool']} pool runs out of process and needs --broker.")
+
+        event = self._create_dataset(options["attendees"])
+        try:
+            self.stdout.write(
+                f"{'pool':<10}{'workers':>8}{'messages':>10}{'msg/s':>10}{'queries/msg':>13}"
+                f"{'maxrss MB':>11}{'p50 ms':>10}{'p99 ms':>10}"
+            )
+            for concurrency in map(int, options["concurrency"].split(",")):
+                with SMTPSink() as sink:
+                    if options["broker"]:
+                        stats = self._run_out_of_process(event, sink, concurrency, options)
+                    else:
+                        stats = self._run_in_process(event, sink, concurrency, options)
+                self._report(options["pool"], concurrency, sink, stats)
+        finally:
+            User.objects.filter(username__startswith="notifybench").delete()
+
+    def _create_dataset(self, attendees):
+        User.objects.filter(username__startswith="notifybench").delete()
+        owner = User.objects.create_user(username="notifybench-owner", email="notifybench-owner@example.com")
+        event = Event.objects.create(
+            title="Notification benchmark",
+            description="Notification benchmark",
+            date=timezone.now() + timezone.timedelta(days=30),
+            location="Online",
+            owner=owner,
+            attendee_count=attendees,
+        )
+        users = User.objects.bulk_create(
+            [User(username=f"notifybench{i}", email=f"notifybench{i}@example.com") for i in range(attendees)],
+            batch_size=5_000,
+        )
+        Event.attendees.through.objects.bulk_create(
+            [Event.attendees.through(event_id=event.id, customuser_id=user.id) for user in users], batch_size=5_000
+        )
+        return event
+
+    def _smtp_settings(self, sink):
+        return {
+            "EMAIL_BACKEND": "django.core.mail.backends.smtp.EmailBackend",
+            "EMAIL_HOST": "127.0.0.1",
+            "EMAIL_PORT": sink.port,
+            "EMAIL_HOST_USER": "",
+            "EMAIL_HOST_PASSWORD": "",
+            "EMAIL_USE_TLS": False,
+        }
+
+    def _enqueue(self, event, sink, options):
+        self.enqueued_at = time.time()
+        send_notification_to_all_attendees.delay(event.id, "Benchmark message", "Benchmark", options["chunk_size"])
+        if not sink.wait_for(options["attendees"], options["timeout"]):
+            raise CommandError(f"Only {len(sink.timestamps)} of {options['attendees']} messages arrived in time.")
+
+    def _run_in_process(self, event, sink, concurrency, options):
+        stats = getattr(self, "_local_stats", None)
+        if stats is None:
+            stats = self._local_stats = LocalStats()
+            install_task_probes(stats)
+        stats.reset()
+        # In-process pools must not publish to the configured broker, where a running worker could take the tasks.
+        with (
+            use_broker("memory://"),
+            override_settings(**self._smtp_settings(sink)),
+            start_worker(app, concurrency=concurrency, pool=options["pool"], perform_ping_check=False),
+        ):
+            self._enqueue(event, sink, options)
+        return stats.read()
+
+    def _run_out_of_process(self, event, sink, concurrency, options):
+        stats = RedisStats(options["broker"])
+        stats.reset()
+        env = {
+            **os.environ,
+            **{name: str(value) for name, value in self._smtp_settings(sink).items() if name != "EMAIL_BACKEND"},
+            "CELERY_BROKER_URL": options["broker"],
+        }
+        command = [
+            sys.executable,
+            str(settings.BASE_DIR / "manage.py"),
+            "benchmark_notifications",
+            "--worker",
+            "--broker",
+            options["broker"],
+        ]
+        command += ["--pool", options["pool"], "--concurrency", str(concurrency)]
+        worker = subprocess.Popen(command, env=env)
+        try:
+            deadline = time.monotonic() + 60
+            while not stats.read().get("ready") and time.monotonic() < deadline:
+                time.sleep(0.1)
+            if not stats.read().get("ready"):
+                raise CommandError("The benchmark worker did not start within 60 seconds.")
+            with use_broker(options["broker"]):
+                self._enqueue(event, sink, options)
+        finally:
+            worker.terminate()
+            worker.wait()
+        return stats.read()
+
+    def _run_worker(self, options):
+        stats = RedisStats(options["broker"])
+        install_task_probes(stats)
+        worker_ready.connect(lambda **kwargs: stats.add("ready", 1), weak=False)
+        app.conf.broker_url = options["broker"]
+        app.worker_main(
+            [
+                "worker",
+                f"--pool={options['pool']}",
+                f"--concurrency={options['concurrency']}",
+                "--loglevel=WARNING",
+                "--without-gossip",
+                "--without-mingle",
+                "--without-heartbeat",
+            ]
+        )
+
+    def _report(self, pool, concurrency, sink, stats):
+        latencies = [(timestamp - self.enqueued_at) * 1000 for timestamp in sink.timestamps]
+        elapsed = max(sink.timestamps) - self.enqueued_at
+        messages = len(sink.timestamps)
+        # ru_maxrss is reported in kilobytes on Linux.
+        maxrss = stats.get("maxrss", resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) / 1024
+        self.stdout.write(
+            f"{pool:<10}{concurrency:>8}{messages:>10}{messages / elapsed:>10.1f}"
+            f"{stats.get('queries', 0) / messages:>13.2f}{maxrss:>11.1f}"
+            f"{percentile(latencies, 50):>10.1f}{percentile(latencies, 99):>10.1f}"
+        )
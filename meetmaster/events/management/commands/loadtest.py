@@ -0,0 +1,174 @@
+import json
+import math
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from events.models import Event
+
+SCENARIOS = ["list", "retrieve", "attendees", "attende", "cancel"]
+DEFAULT_MIX = "list=40,retrieve=35,attendees=10,attende=15,cancel=0"
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+class HttpTransport:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, data=None, token=None):
+        body = json.dumps(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        request.add_header("Content-Type", "application/json")
+        if token:
+            request.add_header("Authorization", f"Bearer {token}")
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.read(), None
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read(), None
+
+
+class InProcessTransport:
+    def __init__(self):
+        # Without --base-url requests never leave the process, so use a host the settings already accept.
+        self.client = Client(HTTP_HOST=(settings.ALLOWED_HOSTS or ["localhost"])[0].lstrip("."))
+
+    def request(self, method, path, data=None, token=None):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.generic(
+                method, path, json.dumps(data) if data is not None else "", "application/json", headers=headers
+            )
+        return response.status_code, response.content, len(queries)
+
+
+class Command(BaseCommand):
+    help = "Run a weighted mix of API requests against a seeded database and report latency percentiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--base-url", help="Server to load, e.g. http://localhost:8000. Runs in-process counting queries if unset."
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--requests", type=int, default=2_000)
+        parser.add_argument("--mix", default=DEFAULT_MIX, help="Scenario weights, e.g. list=40,retrieve=35,cancel=0.")
+        parser.add_argument("--password", default="benchmark", help="Password of the seeded users.")
+        parser.add_argument("--sample-size", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        mix = self._parse_mix(options["mix"])
+        sample = list(
+            Event.objects.filter(status=Event.Status.INCOMING)
+            .order_by("?")
+            .values_list("id", "owner_id", "owner__username")[: options["sample_size"]]
+        )
+        if not sample:
+            raise CommandError("No incoming events found; run seed_benchmark first.")
+
+        events_by_owner = defaultdict(list)
+        for event_id, owner_id, username in sample:
+            events_by_owner[(owner_id, username)].append(event_id)
+        owners = list(events_by_owner)
+        event_ids = [event_id for event_id, _, _ in sample]
+        # Seeded memberships are left alone: each user only joins (and then leaves) events it does not attend yet.
+        attending = set(
+            Event.attendees.through.objects.filter(
+                customuser_id__in=[owner_id for owner_id, _ in owners], event_id__in=event_ids
+            ).values_list("customuser_id", "event_id")
+        )
+
+        def worker(index):
+            rng = random.Random(options["seed"] + index)
+            transport = HttpTransport(options["base_url"]) if options["base_url"] else InProcessTransport()
+            owner = owners[index % len(owners)]
+            targets = {
+                "public": event_ids,
+                "joinable": [event_id for event_id in event_ids if (owner[0], event_id) not in attending],
+                "owned": events_by_owner[owner],
+            }
+            try:
+                status_code, body, _ = transport.request(
+                    "POST", "/api/users/token/", {"username": owner[1], "password": options["password"]}
+                )
+                if status_code != 200:
+                    raise CommandError(f"Could not obtain a token for {owner[1]}: {status_code}")
+                token = json.loads(body)["access"]
+                results = []
+                for _ in range(options["requests"] // options["concurrency"]):
+                    scenario = rng.choices(list(mix), weights=list(mix.values()))[0]
+                    results.extend(self._run(scenario, transport, token, rng, targets))
+                return results
+            finally:
+                connections.close_all()
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(options["concurrency"]) as executor:
+            results = [result for results in executor.map(worker, range(options["concurrency"])) for result in results]
+        self._report(results, time.monotonic() - started)
+
+    def _parse_mix(self, value):
+        mix = {}
+        for item in value.split(","):
+            name, _, weight = item.partition("=")
+            if name not in SCENARIOS or not weight.isdigit():
+                raise CommandError(f"Invalid scenario weight: {item}")
+            mix[name] = int(weight)
+        mix = {name: weight for name, weight in mix.items() if weight}
+        if not mix:
+            raise CommandError("At least one scenario needs a positive weight.")
+        return mix
+
+    def _run(self, scenario, transport, token, rng, targets):
+        if scenario == "list":
+            requests = [("GET", "/api/events/?page_size=10", None)]
+        elif scenario == "retrieve":
+            requests = [("GET", f"/api/events/{rng.choice(targets['public'])}/", None)]
+        elif scenario == "attendees":
+            requests = [("GET", f"/api/events/{rng.choice(targets['owned'])}/attendees/", None)]
+        elif scenario == "attende" and targets["joinable"]:
+            event_id = rng.choice(targets["joinable"])
+            requests = [
+                ("POST", f"/api/events/{event_id}/attende/", {}),
+                ("POST", f"/api/events/{event_id}/remove_attendee/", {}),
+            ]
+        elif scenario == "cancel":
+            requests = [("POST", f"/api/events/{rng.choice(targets['owned'])}/cancel/", {})]
+        else:
+            return []
+
+        results = []
+        for method, path, data in requests:
+            started = time.perf_counter()
+            status_code, _, queries = transport.request(method, path, data, token)
+            results.append((scenario, status_code, (time.perf_counter() - started) * 1000, queries))
+        return results
+
+    def _report(self, results, elapsed):
+        by_scenario = defaultdict(list)
+        for result in results:
+            by_scenario[result[0]].append(result)
+
+        self.stdout.write(f"{'scenario':<12}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p99 ms':>10}{'queries':>10}")
+        for scenario, rows in sorted(by_scenario.items()):
+            latencies = [row[2] for row in rows]
+            errors = sum(1 for row in rows if row[1] >= 400)
+            queries = [row[3] for row in rows if row[3] is not None]
+            queries_per_request = f"{sum(queries) / len(queries):.1f}" if queries else "-"
+            self.stdout.write(
+                f"{scenario:<12}{len(rows):>10}{errors:>8}{percentile(latencies, 50):>10.1f}"
+                f"{percentile(latencies, 99):>10.1f}{queries_per_request:>10}"
+            )
+        self.stdout.write(f"{len(results)} requests in {elapsed:.1f}s ({len(results) / elapsed:.1f} req/s)")
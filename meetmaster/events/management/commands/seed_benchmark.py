@@ -0,0 +1,90 @@
+import random
+
+from common.utils import chunked
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from events.models import Event
+
+User = get_user_model()
+
+LOCATIONS = ["Lisbon", "Porto", "Sao Paulo", "Rio de Janeiro", "Berlin", "London", "New York", "Tokyo", "Online"]
+
+
+class Command(BaseCommand):
+    help = "Seed a benchmark dataset of users and events with a skewed attendee distribution."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--events", type=int, default=1_000_000)
+        parser.add_argument("--max-attendees", type=int, default=5_000)
+        parser.add_argument(
+            "--skew", type=float, default=1.2, help="Pareto shape of attendees per event; lower is more skewed."
+        )
+        parser.add_argument("--batch-size", type=int, default=5_000)
+        parser.add_argument("--prefix", default="bench")
+        parser.add_argument("--password", default="benchmark")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--clear", action="store_true", help="Delete previously seeded users and their events.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = options["prefix"]
+        if options["clear"]:
+            deleted, _ = User.objects.filter(username__startswith=prefix).delete()
+            self.stdout.write(f"Deleted {deleted} rows from a previous run")
+
+        user_ids = self._create_users(options["users"], prefix, options["password"], options["batch_size"])
+        self.stdout.write(f"Created {len(user_ids)} users")
+        events, attendees = self._create_events(
+            rng, user_ids, options["events"], options["max_attendees"], options["skew"], options["batch_size"]
+        )
+        self.stdout.write(self.style.SUCCESS(f"Created {events} events with {attendees} attendees"))
+
+    def _create_users(self, count, prefix, password, batch_size):
+        # Hashing once keeps seeding fast; every seeded user shares the same password.
+        password = make_password(password)
+        start = User.objects.filter(username__startswith=prefix).count()
+        user_ids = []
+        for batch in chunked(range(start, start + count), batch_size):
+            users = User.objects.bulk_create(
+                [User(username=f"{prefix}{i}", email=f"{prefix}{i}@example.com", password=password) for i in batch]
+            )
+            user_ids.extend(user.id for user in users)
+        return user_ids
+
+    def _create_events(self, rng, user_ids, count, max_attendees, skew, batch_size):
+        Attendee = Event.attendees.through
+        now = timezone.now()
+        total_attendees = 0
+        for done, batch in enumerate(chunked(range(count), batch_size), 1):
+            attendee_counts = [min(int(rng.paretovariate(skew)) - 1, max_attendees, len(user_ids)) for _ in batch]
+            dates = [now + timezone.timedelta(minutes=rng.randint(-365 * 24 * 60, 365 * 24 * 60)) for _ in batch]
+            with transaction.atomic():
+                events = Event.objects.bulk_create(
+                    [
+                        Event(
+                            title=f"Benchmark event {i}",
+                            description=f"Seeded event {i} for load and query benchmarks.",
+                            date=date,
+                            location=rng.choice(LOCATIONS),
+                            owner_id=rng.choice(user_ids),
+                            status=Event.Status.FINISHED if date < now else Event.Status.INCOMING,
+                            attendee_count=attendee_count,
+                        )
+                        for i, date, attendee_count in zip(batch, dates, attendee_counts)
+                    ]
+                )
+                Attendee.objects.bulk_create(
+                    [
+                        Attendee(event_id=event.id, customuser_id=user_id)
+                        for event in events
+                        for user_id in rng.sample(user_ids, event.attendee_count)
+                    ],
+                    batch_size=batch_size,
+                )
+            total_attendees += sum(attendee_counts)
+            self.stdout.write(f"Created {min(done * batch_size, count)}/{count} events")
+        return count, total_attendees
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0008_pending_notification"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="event",
+            name="events_even_owner_i_52e16c_idx",
+        ),
+        migrations.AddIndex(
+            model_name="event",
+            index=models.Index(fields=["owner", "-date", "id"], name="events_event_owner_date_idx"),
+        ),
+        migrations.RunSQL(
+            "CREATE INDEX events_event_attendees_user_event_idx ON events_event_attendees (customuser_id, event_id);",
+            "DROP INDEX events_event_attendees_user_event_idx;",
+        ),
+    ]
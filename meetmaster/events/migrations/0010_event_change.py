@@ -0,0 +1,45 @@
+# Generated by Django 5.0.6 on 2026-10-18 13:42
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0009_event_owner_date_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventChange",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("updated", "Updated"),
+                            ("date_changed", "Date changed"),
+                            ("canceled", "Canceled"),
+                            ("finished", "Finished"),
+                            ("attendees_changed", "Attendees changed"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("data", models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "event",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="changes", to="events.event"
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [models.Index(fields=["created"], name="events_even_created_802ab4_idx")],
+            },
+        ),
+    ]
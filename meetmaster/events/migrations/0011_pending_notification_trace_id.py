@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0010_event_change"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="pendingnotification",
+            name="trace_id",
+            field=models.CharField(blank=True, default="", max_length=64),
+        ),
+    ]
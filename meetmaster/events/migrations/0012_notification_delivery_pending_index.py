@@ -0,0 +1,21 @@
+# Generated by Django 5.0.6 on 2026-10-18 14:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0011_pending_notification_trace_id"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notificationdelivery",
+            index=models.Index(
+                condition=models.Q(("status", "PE")), fields=["updated"], name="events_delivery_pending_idx"
+            ),
+        ),
+    ]
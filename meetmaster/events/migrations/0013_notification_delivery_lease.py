@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("events", "0012_notification_delivery_pending_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notificationdelivery",
+            name="leased_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,12 @@
+import uuid
+
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import Q
+from django.db.models.functions import Upper
 
 
 class Event(models.Model):
@@ -17,22 +24,139 @@ class Event(models.Model):
     status = models.CharField(max_length=2, choices=Status.choices, default=Status.INCOMING)
     owner = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="created_events", on_delete=models.CASCADE)
     attendees = models.ManyToManyField(settings.AUTH_USER_MODEL, related_name="attended_events", blank=True)
+    attendee_count = models.PositiveIntegerField(default=0, editable=False)
+    capacity = models.PositiveIntegerField(null=True, blank=True)
+    # Maintained by the events_event_search_vector_trigger database trigger (see migration 0005).
+    search_vector = SearchVectorField(null=True, editable=False)
 
     class Meta:
         ordering = ["-date"]
         indexes = [
             models.Index(fields=["-date", "status"]),
-            models.Index(fields=["owner"]),
+            models.Index(fields=["owner", "-date", "id"], name="events_event_owner_date_idx"),
+            models.Index(fields=["date"], condition=Q(status="IN"), name="events_event_incoming_date_idx"),
+            GinIndex(fields=["search_vector"], name="events_event_search_idx"),
+            GinIndex(OpClass(Upper("location"), name="gin_trgm_ops"), name="events_event_location_trgm_idx"),
         ]
 
     def __str__(self):
         return f"{self.title} ({self.date})"
 
+    def has_attendee(self, user):
+        if not user.is_authenticated:
+            return False
+        return Event.attendees.through.objects.filter(event_id=self.pk, customuser_id=user.pk).exists()
+
+    async def ahas_attendee(self, user):
+        if not user.is_authenticated:
+            return False
+        return await Event.attendees.through.objects.filter(event_id=self.pk, customuser_id=user.pk).aexists()
+
 
 class Notification(models.Model):
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
+    subject = models.CharField(max_length=200, blank=True)
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"Notification for {self.event.title} at {self.created_at}"
+
+
+class NotificationDelivery(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "PE", "Pending"
+        SENT = "SE", "Sent"
+        FAILED = "FA", "Failed"
+        REJECTED = "RE", "Rejected"
+
+    notification = models.ForeignKey(Notification, related_name="deliveries", on_delete=models.CASCADE)
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL, related_name="notification_deliveries", on_delete=models.CASCADE
+    )
+    status = models.CharField(max_length=2, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # Set while a chunk task is sending the delivery, or until its retry is due.
+    leased_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["notification", "recipient"], name="unique_notification_recipient"),
+        ]
+        indexes = [
+            models.Index(fields=["notification", "status"]),
+            models.Index(fields=["updated"], condition=Q(status="PE"), name="events_delivery_pending_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_status_display()} delivery of notification {self.notification_id} to {self.recipient_id}"
+
+
+class PendingNotification(models.Model):
+    event = models.ForeignKey(Event, related_name="pending_notifications", on_delete=models.CASCADE)
+    # A pending notification without recipient goes to every attendee of the event.
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE)
+    subject = models.CharField(max_length=200)
+    message = models.TextField()
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    due_at = models.DateTimeField()
+    # Trace id of the request that last queued or replaced the message.
+    trace_id = models.CharField(max_length=64, blank=True, default="")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["event", "recipient"], name="unique_pending_notification", nulls_distinct=False
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["due_at"]),
+        ]
+
+    def __str__(self):
+        return f"Pending notification for {self.event_id} due at {self.due_at}"
+
+
+class EventChange(models.Model):
+    class Kind(models.TextChoices):
+        UPDATED = "updated", "Updated"
+        DATE_CHANGED = "date_changed", "Date changed"
+        CANCELED = "canceled", "Canceled"
+        FINISHED = "finished", "Finished"
+        ATTENDEES_CHANGED = "attendees_changed", "Attendees changed"
+
+    event = models.ForeignKey(Event, related_name="changes", on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    data = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created"]),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} change of event {self.event_id}"
+
+
+class ExportJob(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "PE", "Pending"
+        READY = "RE", "Ready"
+        FAILED = "FA", "Failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="export_jobs", on_delete=models.CASCADE)
+    # Storage name of the file; the storage may change it on save to keep names unique.
+    path = models.CharField(max_length=255)
+    status = models.CharField(max_length=2, choices=Status.choices, default=Status.PENDING)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.get_status_display()} export {self.id} of {self.requested_by_id}"
@@ -0,0 +1,59 @@
+from common.instrumentation import get_trace_id
+from django.conf import settings
+from django.utils import timezone
+
+from .models import PendingNotification
+
+
+def _due_at():
+    return timezone.now() + timezone.timedelta(seconds=settings.NOTIFICATION_COALESCE_WINDOW)
+
+
+def queue_notification(event, subject, message, recipient=None):
+    # Messages queued for the same event and recipient within the coalescing window replace each other, so only the
+    # latest one is sent once the window of the first one expires.
+    PendingNotification.objects.update_or_create(
+        event=event,
+        recipient=recipient,
+        defaults={"subject": subject, "message": message, "trace_id": get_trace_id()},
+        create_defaults={"subject": subject, "message": message, "due_at": _due_at(), "trace_id": get_trace_id()},
+    )
+
+
+def queue_notifications(event, subject, message, recipient_ids, batch_size=1000):
+    due_at, trace_id = _due_at(), get_trace_id()
+    _bulk_queue(
+        [
+            PendingNotification(
+                event=event,
+                recipient_id=recipient_id,
+                subject=subject,
+                message=message,
+                due_at=due_at,
+                trace_id=trace_id,
+            )
+            for recipient_id in recipient_ids
+        ],
+        batch_size,
+    )
+
+
+def queue_broadcast_notifications(notifications, batch_size=1000):
+    due_at, trace_id = _due_at(), get_trace_id()
+    _bulk_queue(
+        [
+            PendingNotification(event=event, subject=subject, message=message, due_at=due_at, trace_id=trace_id)
+            for event, subject, message in notifications
+        ],
+        batch_size,
+    )
+
+
+def _bulk_queue(pending_notifications, batch_size):
+    PendingNotification.objects.bulk_create(
+        pending_notifications,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["event", "recipient"],
+        update_fields=["subject", "message", "trace_id", "updated"],
+    )
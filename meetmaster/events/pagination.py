@@ -0,0 +1,79 @@
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class AsyncCursorPagination(CursorPagination):
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # CursorPagination.paginate_queryset with the page read through the async ORM, so the async views hand out the
+        # same cursors as the DRF endpoints.
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+        queryset = queryset.order_by(*(_reverse_ordering(self.ordering) if reverse else self.ordering))
+
+        if str(current_position) != "None":
+            is_reversed = self.ordering[0].startswith("-")
+            order_attr = self.ordering[0].lstrip("-")
+            lookup = "lt" if reverse != is_reversed else "gt"
+            filter_query = Q(**{f"{order_attr}__{lookup}": current_position})
+            if (reverse and not is_reversed) or is_reversed:
+                filter_query |= Q(**{f"{order_attr}__isnull": True})
+            queryset = queryset.filter(filter_query)
+
+        # One extra row tells whether a following page exists.
+        limit = offset + self.page_size + 1
+        results = [item async for item in queryset[offset:limit]]
+        self.page = results[: self.page_size]
+        has_following_position = len(results) > len(self.page)
+        following_position = (
+            self._get_position_from_instance(results[-1], self.ordering) if has_following_position else None
+        )
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = has_following_position
+            self.next_position = current_position if self.has_next else None
+            self.previous_position = following_position if self.has_previous else None
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position if self.has_next else None
+            self.previous_position = current_position if self.has_previous else None
+        return self.page
+
+
+class EventCursorPagination(AsyncCursorPagination):
+    ordering = ("-date", "id")
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class UpcomingEventCursorPagination(EventCursorPagination):
+    ordering = ("date", "id")
+
+
+class AttendeeCursorPagination(AsyncCursorPagination):
+    ordering = "id"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class NotificationCursorPagination(CursorPagination):
+    ordering = "-id"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+
+class NotificationDeliveryCursorPagination(CursorPagination):
+    ordering = "id"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
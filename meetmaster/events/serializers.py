@@ -1,42 +1,139 @@
+from common.serializers import TimedSerializerMixin
 from common.utils import model_data_prop_was_changed
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from rest_framework import serializers
 
-from .models import Event
-from .tasks import send_notification_to_all_attendees, send_notification_to_attendee
+from .cache import invalidate_all_events, invalidate_event
+from .changes import publish_event_change, publish_event_changes
+from .models import Event, EventChange, Notification, NotificationDelivery
+from .notifications import queue_broadcast_notifications, queue_notification, queue_notifications
+from .tasks import schedule_event_finish
 
+User = get_user_model()
 
-class EventSerializer(serializers.ModelSerializer):
+
+class EventListSerializer(serializers.ListSerializer):
+    def run_child_validation(self, data):
+        if self.instance is not None:
+            self.child.instance = self._get_instance(data)
+            self.child.initial_data = data
+            validated = super().run_child_validation(data)
+            validated["id"] = self.child.instance.id
+            return validated
+        return super().run_child_validation(data)
+
+    def validate(self, attrs):
+        if self.instance is not None:
+            ids = [item["id"] for item in attrs]
+            if len(ids) != len(set(ids)):
+                raise serializers.ValidationError("Each event can only be updated once per request.")
+        return attrs
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            events = Event.objects.bulk_create([Event(**attrs) for attrs in validated_data], batch_size=500)
+            for event in events:
+                schedule_event_finish(event.id, event.date)
+        invalidate_all_events()
+        return events
+
+    def update(self, instance, validated_data):
+        events = {event.id: event for event in instance}
+        now = timezone.now()
+        fields = {"updated"}
+        updated_events = []
+        date_changed_events = []
+        for attrs in validated_data:
+            event = events[attrs.pop("id")]
+            if model_data_prop_was_changed(event, attrs, "date"):
+                date_changed_events.append(event)
+            for attr, value in attrs.items():
+                setattr(event, attr, value)
+            event.updated = now
+            fields.update(attrs)
+            updated_events.append(event)
+        with transaction.atomic():
+            Event.objects.bulk_update(updated_events, sorted(fields), batch_size=500)
+            for event in date_changed_events:
+                schedule_event_finish(event.id, event.date)
+            queue_broadcast_notifications(
+                (event, "Event Date Change Notification", self.child.date_change_message(event))
+                for event in date_changed_events
+            )
+            date_changed_ids = {event.id for event in date_changed_events}
+            publish_event_changes(
+                [self.child.change_for(event, event.id in date_changed_ids) for event in updated_events]
+            )
+        invalidate_all_events()
+        return updated_events
+
+    def _get_instance(self, data):
+        if not hasattr(self, "_instances"):
+            self._instances = {event.id: event for event in self.instance}
+        event_id = data.get("id") if isinstance(data, dict) else None
+        if event_id not in self._instances:
+            raise serializers.ValidationError({"id": "A valid event id is required."})
+        return self._instances[event_id]
+
+
+class EventSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     id = serializers.IntegerField(read_only=True)
-    total_attendees = serializers.SerializerMethodField()
+    total_attendees = serializers.IntegerField(source="attendee_count", read_only=True)
     status = serializers.ChoiceField(choices=Event.Status.choices, read_only=True, source="get_status_display")
     owner = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
     class Meta:
         model = Event
-        exclude = ["attendees"]
+        exclude = ["attendees", "attendee_count", "search_vector"]
         read_only_fields = ["created", "updated", "status", "total_attendees"]
+        list_serializer_class = EventListSerializer
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            instance = super().create(validated_data)
+            schedule_event_finish(instance.id, instance.date)
+        invalidate_event(instance.id)
+        return instance
 
     def update(self, instance, validated_data):
         date_changed = model_data_prop_was_changed(instance, validated_data, "date")
-        response = super().update(instance, validated_data)
-        self._notify(date_changed, instance)
+        with transaction.atomic():
+            response = super().update(instance, validated_data)
+            if date_changed:
+                schedule_event_finish(instance.id, instance.date)
+            self._notify(date_changed, instance)
+            publish_event_changes([self.change_for(instance, date_changed)])
+        invalidate_event(instance.id)
         return response
 
+    def validate_capacity(self, value):
+        if self.instance is not None and value is not None and value < self.instance.attendee_count:
+            raise serializers.ValidationError("Capacity cannot be lower than the current number of attendees.")
+        return value
+
     def validate_date(self, value):
         current_datetime = timezone.now()
         if value < current_datetime:
             raise serializers.ValidationError("Events cannot be created in the past.")
         return value
 
+    def change_for(self, instance, date_changed):
+        if date_changed:
+            return EventChange(event_id=instance.id, kind=EventChange.Kind.DATE_CHANGED, data={"date": instance.date})
+        return EventChange(event_id=instance.id, kind=EventChange.Kind.UPDATED)
+
+    def date_change_message(self, instance):
+        return f"The date for the event '{instance.title}' has been changed to {instance.date}."
+
     def _notify(self, date_changed, instance):
         if date_changed:
-            message = f"The date for the event '{instance.title}' has been changed to {instance.date}."
             subject = "Event Date Change Notification"
-            send_notification_to_all_attendees.delay(instance.id, message, subject)
-
-    def get_total_attendees(self, obj):
-        return obj.attendees.count()
+            queue_notification(instance, subject, self.date_change_message(instance))
 
 
 class EventAttendeeSerializer(serializers.ModelSerializer):
@@ -46,27 +143,113 @@ class EventAttendeeSerializer(serializers.ModelSerializer):
 
     def add_attendee(self, instance):
         user = self.context["request"].user
-        instance.attendees.add(user)
-        instance.save()
-        self._notify_add(instance, user)
+        has_free_seat = Q(capacity__isnull=True) | Q(attendee_count__lt=F("capacity"))
+        with transaction.atomic():
+            # The unique attendee row settles concurrent RSVPs of the same user, so only the one that inserted it
+            # takes a seat; when none is left the insert is rolled back with the rest of the block.
+            if not insert_attendees(instance.pk, [user.pk]):
+                return instance
+            if not self._update_attendee_count(instance, F("attendee_count") + 1, has_free_seat):
+                raise serializers.ValidationError("This event is at full capacity.")
+            self._notify_add(instance, user)
+            publish_event_change(instance.id, EventChange.Kind.ATTENDEES_CHANGED)
+        invalidate_event(instance.id)
         return instance
 
     def remove_attendee(self, instance):
         user = self.context["request"].user
-        instance.attendees.remove(user)
-        instance.save()
-        self._notify_remove(instance, user)
+        with transaction.atomic():
+            if not delete_attendees(instance.pk, [user.pk]):
+                return instance
+            self._update_attendee_count(instance, F("attendee_count") - 1, Q(attendee_count__gt=0))
+            self._notify_remove(instance, user)
+            publish_event_change(instance.id, EventChange.Kind.ATTENDEES_CHANGED)
+        invalidate_event(instance.id)
         return instance
 
+    def _update_attendee_count(self, instance, value, condition):
+        return Event.objects.filter(condition, pk=instance.pk).update(attendee_count=value, updated=timezone.now())
+
     def _notify_add(self, event, user):
         message = f"You have been added as an attendee to the event '{event.title}'."
         subject = "Event Attendee Notification"
-        send_notification_to_attendee.delay(user.id, event.id, message, subject)
+        queue_notification(event, subject, message, recipient=user)
 
     def _notify_remove(self, event, user):
         message = f"You have been removed as an attendee from the event '{event.title}'."
         subject = "Event Attendee Removal Notification"
-        send_notification_to_attendee.delay(user.id, event.id, message, subject)
+        queue_notification(event, subject, message, recipient=user)
+
+
+class EventBulkAttendeeSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=settings.BULK_ATTENDEES_MAX_SIZE
+    )
+
+    def validate_user_ids(self, value):
+        user_ids = set(value)
+        unknown_ids = user_ids - set(User.objects.filter(id__in=user_ids).values_list("id", flat=True))
+        if unknown_ids:
+            raise serializers.ValidationError(f"Unknown users: {sorted(unknown_ids)}.")
+        return sorted(user_ids)
+
+    def add_attendees(self, instance):
+        user_ids = self.validated_data["user_ids"]
+        with transaction.atomic():
+            # Rows first, then seats, in the same order as a single RSVP so the two cannot deadlock. Only the rows this
+            # request inserted take a seat, and all of them are rolled back when there are not enough left.
+            new_ids = insert_attendees(instance.pk, user_ids)
+            has_room = Q(capacity__isnull=True) | Q(capacity__gte=F("attendee_count") + len(new_ids))
+            if new_ids and not Event.objects.filter(has_room, pk=instance.pk).update(
+                attendee_count=F("attendee_count") + len(new_ids), updated=timezone.now()
+            ):
+                raise serializers.ValidationError("Adding these users would exceed the event capacity.")
+            message = f"You have been added as an attendee to the event '{instance.title}'."
+            queue_notifications(instance, "Event Attendee Notification", message, new_ids)
+            if new_ids:
+                publish_event_change(instance.pk, EventChange.Kind.ATTENDEES_CHANGED)
+        invalidate_event(instance.pk)
+        return new_ids
+
+    def remove_attendees(self, instance):
+        user_ids = self.validated_data["user_ids"]
+        with transaction.atomic():
+            # Only the rows this DELETE removed count: a concurrent removal may have deleted some of them already.
+            removed_ids = delete_attendees(instance.pk, user_ids)
+            Event.objects.filter(pk=instance.pk).update(
+                attendee_count=Greatest(F("attendee_count") - len(removed_ids), 0), updated=timezone.now()
+            )
+            message = f"You have been removed as an attendee from the event '{instance.title}'."
+            queue_notifications(instance, "Event Attendee Removal Notification", message, removed_ids)
+            if removed_ids:
+                publish_event_change(instance.pk, EventChange.Kind.ATTENDEES_CHANGED)
+        invalidate_event(instance.pk)
+        return removed_ids
+
+
+def insert_attendees(event_id, user_ids):
+    # Returns the users that were not attendees yet, in one statement and without get_or_create's savepoints.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {_attendee_table()} (event_id, customuser_id) SELECT %s, unnest(%s::bigint[]) "
+            "ON CONFLICT DO NOTHING RETURNING customuser_id",
+            [event_id, list(user_ids)],
+        )
+        return sorted(user_id for (user_id,) in cursor.fetchall())
+
+
+def delete_attendees(event_id, user_ids):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {_attendee_table()} WHERE event_id = %s AND customuser_id = ANY(%s::bigint[]) "
+            "RETURNING customuser_id",
+            [event_id, list(user_ids)],
+        )
+        return sorted(user_id for (user_id,) in cursor.fetchall())
+
+
+def _attendee_table():
+    return connection.ops.quote_name(Event.attendees.through._meta.db_table)
 
 
 class EventCancelSerializer(EventSerializer):
@@ -75,12 +258,37 @@ class EventCancelSerializer(EventSerializer):
         fields = []
 
     def update(self, instance, validated_data):
-        instance.status = Event.Status.CANCELED
-        instance.save()
-        self._notify(instance)
+        with transaction.atomic():
+            instance.status = Event.Status.CANCELED
+            instance.save()
+            self._notify(instance)
+            publish_event_change(instance.id, EventChange.Kind.CANCELED)
+        invalidate_event(instance.id)
         return instance
 
     def _notify(self, event):
         message = f"The event '{event.title}' has been canceled."
         subject = "Event Cancellation Notification"
-        send_notification_to_all_attendees.delay(event.id, message, subject)
+        queue_notification(event, subject, message)
+
+
+class NotificationDeliverySerializer(serializers.ModelSerializer):
+    status = serializers.CharField(source="get_status_display", read_only=True)
+
+    class Meta:
+        model = NotificationDelivery
+        fields = ["id", "recipient", "status", "attempts", "last_error", "created", "updated", "sent_at"]
+
+
+class NotificationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    deliveries = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Notification
+        fields = ["id", "event", "subject", "message", "created_at", "deliveries"]
+
+    def get_deliveries(self, obj):
+        return {
+            status.label.lower(): getattr(obj, f"deliveries_{status.name.lower()}")
+            for status in NotificationDelivery.Status
+        }
@@ -1,54 +1,329 @@
-from celery import shared_task
+import logging
+import time
+from collections import defaultdict
+from smtplib import SMTPException, SMTPRecipientsRefused
+
+from celery import group, shared_task
+from celery.utils.time import get_exponential_backoff_interval
+from common.instrumentation import record_emails, use_trace_id
+from common.outbox import enqueue
+from common.utils import advisory_lock, chunked
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from events.models import Event, Notification
+from events.cache import invalidate_all_events, invalidate_event
+from events.changes import publish_event_change, publish_event_changes
+from events.exports import ATTENDEE_EXPORT_FIELDS, EVENT_EXPORT_FIELDS, attendee_rows, event_rows, write_export
+from events.filters import filter_events
+from events.models import Event, EventChange, ExportJob, Notification, NotificationDelivery, PendingNotification
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
 
 @shared_task
-def send_notification_to_all_attendees(event_id, message, subject):
+def send_notification_to_all_attendees(event_id, message, subject, chunk_size=None):
     event = Event.objects.get(id=event_id)
-    attendees = event.attendees.all()
-    from_email = settings.DEFAULT_FROM_EMAIL
+    chunk_size = chunk_size or settings.NOTIFICATION_CHUNK_SIZE
+    notification = Notification.objects.create(event=event, subject=subject, message=message)
+    attendee_ids = event.attendees.order_by("id").values_list("id", flat=True).iterator(chunk_size=chunk_size)
+    return _dispatch_delivery_chunks(_create_deliveries(notification, attendee_ids, chunk_size))
 
-    for attendee in attendees:
-        print(f"Sending notification to {attendee.email}")
-        send_mail(
-            subject,
-            message,
-            from_email,
-            [attendee.email],
-            fail_silently=False,
+
+@shared_task
+def retry_failed_deliveries(notification_id, chunk_size=None):
+    chunk_size = chunk_size or settings.NOTIFICATION_CHUNK_SIZE
+    # Only deliveries whose chunk ran out of retries are failed; they are pending again before being dispatched, so a
+    # second retry of the same notification finds nothing left to send.
+    with transaction.atomic():
+        failed_ids = list(
+            NotificationDelivery.objects.filter(
+                notification_id=notification_id, status=NotificationDelivery.Status.FAILED
+            )
+            .order_by("id")
+            .select_for_update()
+            .values_list("id", flat=True)
         )
-    Notification.objects.create(event=event, message=message)
+        NotificationDelivery.objects.filter(id__in=failed_ids).update(
+            status=NotificationDelivery.Status.PENDING, updated=timezone.now()
+        )
+    return _dispatch_delivery_chunks(chunked(failed_ids, chunk_size))
 
 
 @shared_task
-def send_notification_to_attendee(attendee_id, event_id, message, subject):
-    event = Event.objects.get(id=event_id)
-    attendee = User.objects.get(id=attendee_id)
+def flush_pending_notifications(batch_size=500):
+    with transaction.atomic():
+        pending = list(
+            PendingNotification.objects.filter(due_at__lte=timezone.now())
+            .order_by("due_at")
+            .select_for_update(skip_locked=True)[:batch_size]
+        )
+        PendingNotification.objects.filter(id__in=[notification.id for notification in pending]).delete()
+
+        broadcasts, personal, trace_ids = [], defaultdict(list), {}
+        for notification in pending:
+            if notification.recipient_id is None:
+                broadcasts.append(notification)
+            else:
+                key = (notification.event_id, notification.subject, notification.message)
+                personal[key].append(notification.recipient_id)
+                # Coalesced messages are sent together under the trace of the request that queued the latest one.
+                trace_ids[key] = notification.trace_id
+
+        delivery_chunks = defaultdict(list)
+        for key, recipient_ids in personal.items():
+            event_id, subject, message = key
+            notification = Notification.objects.create(event_id=event_id, subject=subject, message=message)
+            delivery_chunks[trace_ids[key]].extend(
+                _create_deliveries(notification, recipient_ids, settings.NOTIFICATION_CHUNK_SIZE)
+            )
+
+    for notification in broadcasts:
+        with use_trace_id(notification.trace_id):
+            send_notification_to_all_attendees.delay(notification.event_id, notification.message, notification.subject)
+    for trace_id, chunks in delivery_chunks.items():
+        with use_trace_id(trace_id):
+            _dispatch_delivery_chunks(chunks)
+    _requeue_stale_deliveries(batch_size)
+    return len(pending)
+
+
+def _requeue_stale_deliveries(batch_size):
+    # A delivery whose chunk task was lost, e.g. to a broker restart, or whose worker died while holding its lease
+    # would otherwise stay pending for good. A chunk that is merely stuck in a backlog may be queued a second time, but
+    # the claim in send_notification_chunk lets only one of the copies send. Its clock is restarted when it is queued
+    # again, so a long queue does not get it dispatched on every flush.
+    now = timezone.now()
+    cutoff = now - timezone.timedelta(seconds=settings.NOTIFICATION_DELIVERY_STALE_AFTER)
+    with transaction.atomic():
+        stale_ids = list(
+            NotificationDelivery.objects.filter(status=NotificationDelivery.Status.PENDING, updated__lt=cutoff)
+            .filter(Q(leased_until__isnull=True) | Q(leased_until__lte=now))
+            .order_by("updated")
+            .select_for_update(skip_locked=True)
+            .values_list("id", flat=True)[:batch_size]
+        )
+        NotificationDelivery.objects.filter(id__in=stale_ids).update(updated=timezone.now())
+    if stale_ids:
+        logger.warning("Requeuing %d notification deliveries left pending", len(stale_ids))
+    return _dispatch_delivery_chunks(chunked(stale_ids, settings.NOTIFICATION_CHUNK_SIZE))
+
+
+def _create_deliveries(notification, recipient_ids, chunk_size):
+    delivery_chunks = []
+    for chunk in chunked(recipient_ids, chunk_size):
+        deliveries = NotificationDelivery.objects.bulk_create(
+            [NotificationDelivery(notification=notification, recipient_id=recipient_id) for recipient_id in chunk]
+        )
+        delivery_chunks.append([delivery.id for delivery in deliveries])
+    return delivery_chunks
+
+
+def _dispatch_delivery_chunks(delivery_chunks):
+    signatures = [send_notification_chunk.s(delivery_ids) for delivery_ids in delivery_chunks]
+    if signatures:
+        group(signatures).apply_async()
+    return len(signatures)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def send_notification_chunk(self, delivery_ids):
+    deliveries = list(
+        NotificationDelivery.objects.filter(id__in=_claim_deliveries(delivery_ids))
+        .order_by("id")
+        .values_list("id", "recipient__email", "notification__subject", "notification__message")
+    )
     from_email = settings.DEFAULT_FROM_EMAIL
+    sent, rejected, position = [], [], 0
+
+    try:
+        with get_connection() as smtp:
+            for position, (delivery_id, email, subject, message) in enumerate(deliveries):
+                try:
+                    EmailMessage(subject, message, from_email, [email], connection=smtp).send()
+                except SMTPRecipientsRefused as exc:
+                    rejected.append((delivery_id, str(exc)))
+                else:
+                    sent.append(delivery_id)
+            position = len(deliveries)
+    except (SMTPException, OSError) as exc:
+        pending_ids = [delivery_id for delivery_id, *_ in deliveries[position:]]
+        retrying = bool(pending_ids) and self.request.retries < self.max_retries
+        countdown = _retry_countdown(self) if retrying else None
+        # Deliveries stay pending, leased until the retry is due, while this task retries them and only fail once it
+        # is out of retries.
+        retry_at = timezone.now() + timezone.timedelta(seconds=countdown) if retrying else None
+        _record_deliveries(sent, rejected, pending_ids, str(exc), retry_at=retry_at)
+        record_emails(len(sent))
+        # Only the deliveries that were not handed to the SMTP server yet are retried.
+        if retrying:
+            raise self.retry(exc=exc, args=(pending_ids,), countdown=countdown)
+        return {"sent": len(sent), "rejected": len(rejected), "failed": len(pending_ids)}
+
+    _record_deliveries(sent, rejected)
+    record_emails(len(sent))
+    return {"sent": len(sent), "rejected": len(rejected), "failed": 0}
 
-    send_mail(
-        subject,
-        message,
-        from_email,
-        [attendee.email],
-        fail_silently=False,
+
+def _claim_deliveries(delivery_ids):
+    # A chunk can run twice, e.g. when it is requeued while the original still waits in a backlog. Each run leases the
+    # pending deliveries it is about to send in one conditional UPDATE, so only one of them sends a given delivery.
+    # The lease runs out if the worker dies mid-chunk, which makes its deliveries eligible for requeuing.
+    now = timezone.now()
+    leased_until = now + timezone.timedelta(seconds=settings.NOTIFICATION_DELIVERY_LEASE)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {connection.ops.quote_name(NotificationDelivery._meta.db_table)} "
+            "SET leased_until = %s, updated = %s WHERE id = ANY(%s::bigint[]) AND status = %s "
+            "AND (leased_until IS NULL OR leased_until <= %s) RETURNING id",
+            [leased_until, now, list(delivery_ids), NotificationDelivery.Status.PENDING, now],
+        )
+        return [delivery_id for (delivery_id,) in cursor.fetchall()]
+
+
+def _retry_countdown(task):
+    # retry_backoff only applies to autoretry_for, so manual retries back off here: exponentially from
+    # default_retry_delay with full jitter, so chunks failed by the same SMTP outage do not all come back at once.
+    return get_exponential_backoff_interval(
+        task.default_retry_delay, task.request.retries, settings.NOTIFICATION_RETRY_BACKOFF_MAX, full_jitter=True
     )
-    Notification.objects.create(event=event, message=message)
+
+
+def _record_deliveries(sent_ids, rejected, unsent_ids=(), error="", retry_at=None):
+    deliveries = NotificationDelivery.objects
+    attempted = {"attempts": F("attempts") + 1, "updated": timezone.now(), "leased_until": None}
+    if sent_ids:
+        deliveries.filter(id__in=sent_ids).update(
+            status=NotificationDelivery.Status.SENT, sent_at=timezone.now(), last_error="", **attempted
+        )
+    for delivery_id, rejection in rejected:
+        deliveries.filter(id=delivery_id).update(
+            status=NotificationDelivery.Status.REJECTED, last_error=rejection, **attempted
+        )
+    if unsent_ids:
+        status = NotificationDelivery.Status.PENDING if retry_at else NotificationDelivery.Status.FAILED
+        deliveries.filter(id__in=unsent_ids).update(
+            status=status, last_error=error, **{**attempted, "leased_until": retry_at}
+        )
+
+
+def schedule_event_finish(event_id, date):
+    if date - timezone.now() <= timezone.timedelta(seconds=settings.EVENT_FINISH_SCHEDULE_HORIZON):
+        enqueue(finish_event, event_id, eta=date)
 
 
 @shared_task
-def update_event_statuses(batch_size=1000):
+def finish_event(event_id):
+    with transaction.atomic():
+        updated = Event.objects.filter(id=event_id, status=Event.Status.INCOMING, date__lte=timezone.now()).update(
+            status=Event.Status.FINISHED
+        )
+        if updated:
+            publish_event_change(event_id, EventChange.Kind.FINISHED)
+    if updated:
+        invalidate_event(event_id)
+    return updated
+
+
+@shared_task
+def schedule_due_event_finishes():
     now = timezone.now()
-    while True:
-        event_ids = list(
-            Event.objects.filter(status=Event.Status.INCOMING, date__lt=now).values_list("id", flat=True)[:batch_size]
+    horizon = now + timezone.timedelta(seconds=settings.EVENT_FINISH_SCHEDULE_HORIZON)
+    due_events = Event.objects.filter(status=Event.Status.INCOMING, date__gt=now, date__lte=horizon)
+    scheduled = 0
+    for event_id, date in due_events.values_list("id", "date").iterator():
+        finish_event.apply_async((event_id,), eta=date)
+        scheduled += 1
+    return scheduled
+
+
+@shared_task
+def update_event_statuses(batch_size=1000):
+    with advisory_lock("events:update_event_statuses") as acquired:
+        if not acquired:
+            logger.info("update_event_statuses skipped: another run holds the lock")
+            return None
+
+        started = time.monotonic()
+        due_events = (
+            Event.objects.filter(status=Event.Status.INCOMING, date__lt=timezone.now())
+            .order_by("date")
+            .select_for_update(skip_locked=True)
+            .values_list("id", flat=True)
         )
+        transitioned = 0
+        while True:
+            with transaction.atomic():
+                event_ids = list(due_events[:batch_size])
+                updated = Event.objects.filter(id__in=event_ids).update(status=Event.Status.FINISHED)
+                publish_event_changes(
+                    [EventChange(event_id=event_id, kind=EventChange.Kind.FINISHED) for event_id in event_ids]
+                )
+            transitioned += updated
+            if updated < batch_size:
+                break
+
+    if transitioned:
+        invalidate_all_events()
+    duration_ms = round((time.monotonic() - started) * 1000, 2)
+    logger.info("update_event_statuses finished %d events in %.2fms", transitioned, duration_ms)
+    return {"transitioned": transitioned, "duration_ms": duration_ms}
+
+
+@shared_task
+def reconcile_attendee_counts(batch_size=1000):
+    attendees = Event.attendees.through.objects.filter(event=OuterRef("pk")).order_by().values("event")
+    actual_count = Coalesce(Subquery(attendees.annotate(total=Count("*")).values("total")), 0)
+    repaired, last_id = 0, 0
+    while True:
+        event_ids = list(Event.objects.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size])
         if not event_ids:
             break
-        Event.objects.filter(id__in=event_ids).update(status=Event.Status.FINISHED)
+        repaired += (
+            Event.objects.filter(id__in=event_ids)
+            .annotate(actual_count=actual_count)
+            .exclude(attendee_count=F("actual_count"))
+            .update(attendee_count=actual_count)
+        )
+        last_id = event_ids[-1]
+    if repaired:
+        invalidate_all_events()
+    return repaired
+
+
+@shared_task
+def prune_event_changes():
+    cutoff = timezone.now() - timezone.timedelta(seconds=settings.EVENT_CHANGES_RETENTION)
+    deleted, _ = EventChange.objects.filter(created__lt=cutoff).delete()
+    return deleted
+
+
+@shared_task
+def export_events(user_id, params, export_type, path, job_id=None):
+    events = Event.objects.all()
+    if not User.objects.filter(id=user_id, is_superuser=True).exists():
+        events = events.filter(owner_id=user_id)
+    return _write_job_export(job_id, event_rows(filter_events(events, params)), EVENT_EXPORT_FIELDS, export_type, path)
+
+
+@shared_task
+def export_attendees(event_id, export_type, path, job_id=None):
+    event = Event.objects.get(id=event_id)
+    return _write_job_export(job_id, attendee_rows(event), ATTENDEE_EXPORT_FIELDS, export_type, path)
+
+
+def _write_job_export(job_id, rows, fields, export_type, path):
+    try:
+        path = write_export(rows, fields, export_type, path)
+    except Exception:
+        if job_id is not None:
+            ExportJob.objects.filter(id=job_id).update(status=ExportJob.Status.FAILED)
+        raise
+    if job_id is not None:
+        ExportJob.objects.filter(id=job_id).update(status=ExportJob.Status.READY, path=path)
+    return path
@@ -0,0 +1,245 @@
+import asyncio
+import json
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from common.authentication import issue_tokens
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient
+from django.urls import reverse
+from django.utils import timezone
+from events.changes import listener, publish_event_change, publish_event_changes, stream_changes
+from events.models import Event, EventChange
+from rest_framework.test import APIClient
+
+
+@pytest.fixture
+def async_client():
+    return AsyncClient()
+
+
+@pytest.fixture
+def create_users():
+    custom_user = get_user_model()
+    user1 = custom_user.objects.create_user(username="user1", email="email1@mail.com", password="password")
+    user2 = custom_user.objects.create_user(username="user2", email="email2@mail.com", password="password")
+    return {"user1": user1, "user2": user2}
+
+
+@pytest.fixture
+def create_events(create_users):
+    return [
+        Event.objects.create(
+            title=f"Event {days}",
+            description=f"Description for event {days}",
+            date=timezone.now() + timezone.timedelta(days=days),
+            location=f"Location {days}",
+            owner=create_users["user1"],
+        )
+        for days in [1, 2, 3]
+    ]
+
+
+def get(client, url, data=None, **extra):
+    return async_to_sync(client.get)(url, data, **extra)
+
+
+@pytest.mark.django_db
+class TestAsyncEventViews:
+
+    def test_list_events_is_cursor_paginated(self, async_client, create_events):
+        response = get(async_client, reverse("async-event-list"), {"page_size": 2})
+        assert response.status_code == 200
+        assert [event["id"] for event in response.json()["results"]] == [create_events[2].id, create_events[1].id]
+
+        response = get(async_client, response.json()["next"])
+        assert [event["id"] for event in response.json()["results"]] == [create_events[0].id]
+        assert response.json()["next"] is None
+
+        assert get(async_client, reverse("async-event-list"), {"cursor": "invalid"}).status_code == 404
+
+    def test_list_cursors_are_interchangeable_with_drf(self, async_client, create_events):
+        Event.objects.filter(pk=create_events[0].pk).update(date=create_events[2].date)
+        response = get(async_client, reverse("async-event-list"), {"page_size": 1})
+        assert response.json()["results"][0]["id"] == create_events[0].id
+
+        cursor = parse_qs(urlparse(response.json()["next"]).query)["cursor"][0]
+        drf_response = APIClient().get(reverse("event-list"), {"page_size": 1, "cursor": cursor})
+        assert [event["id"] for event in drf_response.data["results"]] == [create_events[2].id]
+
+        cursor = parse_qs(urlparse(drf_response.data["next"]).query)["cursor"][0]
+        response = get(async_client, reverse("async-event-list"), {"page_size": 1, "cursor": cursor})
+        assert [event["id"] for event in response.json()["results"]] == [create_events[1].id]
+
+    def test_list_events_applies_filters(self, async_client, create_events):
+        response = get(async_client, reverse("async-event-list"), {"location": "location 2"})
+        assert [event["id"] for event in response.json()["results"]] == [create_events[1].id]
+
+        response = get(async_client, reverse("async-event-list"), {"status": "XX"})
+        assert response.status_code == 400
+
+    def test_retrieve_event(self, async_client, create_events):
+        response = get(async_client, reverse("async-event-detail", kwargs={"pk": create_events[0].id}))
+        assert response.json()["title"] == "Event 1"
+        assert response.json()["total_attendees"] == 0
+
+        response = get(async_client, reverse("async-event-detail", kwargs={"pk": 999999}))
+        assert response.status_code == 404
+
+    def test_attendee_can_page_through_attendees(self, async_client, create_users, create_events):
+        event = create_events[0]
+        event.attendees.add(create_users["user1"], create_users["user2"])
+        async_client.force_login(create_users["user2"])
+        url = reverse("async-event-attendees", kwargs={"pk": event.id})
+
+        response = get(async_client, url, {"page_size": 1})
+        assert set(response.json()) == {"next", "previous", "results"}
+        assert response.json()["results"] == [{"id": create_users["user1"].id, "username": "user1"}]
+
+        # Cursors are interchangeable with the DRF endpoint.
+        api_client = APIClient()
+        api_client.force_authenticate(create_users["user2"])
+        cursor = parse_qs(urlparse(response.json()["next"]).query)["cursor"][0]
+        drf_response = api_client.get(reverse("event-attendees", kwargs={"pk": event.id}), {"cursor": cursor})
+        assert drf_response.data["results"] == [{"id": create_users["user2"].id, "username": "user2"}]
+
+        response = get(async_client, response.json()["next"])
+        assert response.json()["results"] == [{"id": create_users["user2"].id, "username": "user2"}]
+        assert response.json()["next"] is None
+
+        assert get(async_client, url, {"cursor": "invalid"}).status_code == 404
+
+    def test_attendees_accept_bearer_tokens(self, async_client, create_users, create_events):
+        url = reverse("async-event-attendees", kwargs={"pk": create_events[0].id})
+        access = issue_tokens(create_users["user1"])["access"]
+
+        response = get(async_client, url, headers={"Authorization": f"Bearer {access}"})
+        assert response.status_code == 200
+        assert get(async_client, url, headers={"Authorization": "Bearer invalid"}).status_code == 401
+
+    def test_non_attendee_cannot_view_attendees(self, async_client, create_users, create_events):
+        url = reverse("async-event-attendees", kwargs={"pk": create_events[0].id})
+        assert get(async_client, url).status_code == 403
+
+        async_client.force_login(create_users["user2"])
+        assert get(async_client, url).status_code == 403
+
+
+async def read_stream(response, count):
+    chunks = []
+    async for chunk in response.streaming_content:
+        chunks.append(chunk.decode())
+        if len(chunks) == count:
+            break
+    await listener.stop()
+    return chunks
+
+
+@pytest.mark.django_db
+class TestEventChangeFeed:
+
+    def test_feed_resumes_after_last_event_id(self, settings, async_client, create_events):
+        settings.EVENT_CHANGES_HEARTBEAT = 0.1
+        first = publish_event_change(create_events[0].id, EventChange.Kind.CANCELED)[0]
+        second = publish_event_change(create_events[1].id, EventChange.Kind.DATE_CHANGED, {"date": "2030-01-01"})[0]
+        publish_event_change(create_events[2].id, EventChange.Kind.UPDATED)
+
+        async def subscribe():
+            response = await async_client.get(
+                reverse("async-event-changes"), {"event": create_events[1].id}, headers={"Last-Event-ID": str(first.id)}
+            )
+            assert response["Content-Type"] == "text/event-stream"
+            return await read_stream(response, 2)
+
+        change, heartbeat = async_to_sync(subscribe)()
+        lines = change.splitlines()
+        assert lines[:2] == [f"id: {second.id}", "event: date_changed"]
+        assert json.loads(lines[2].removeprefix("data: "))["data"] == {"date": "2030-01-01"}
+        assert heartbeat == ": keep-alive\n\n"
+
+    def test_feed_sends_change_committed_after_a_higher_id_once(self, settings, async_client, create_events):
+        settings.EVENT_CHANGES_HEARTBEAT = 0.5
+        settings.EVENT_CHANGES_POLL_INTERVAL = 0.05
+        (late,) = publish_event_change(create_events[0].id, EventChange.Kind.UPDATED)
+        publish_event_change(create_events[1].id, EventChange.Kind.CANCELED)
+        late_id = late.id
+        late.delete()
+
+        async def subscribe():
+            response = await async_client.get(reverse("async-event-changes"))
+            stream = aiter(response.streaming_content)
+            chunks = [await anext(stream)]
+            # A transaction that wrote its change before the latest one only commits now.
+            await sync_to_async(EventChange.objects.create)(id=late_id, event=create_events[0], kind=late.kind)
+            chunks += [await anext(stream), await anext(stream)]
+            await listener.stop()
+            return [chunk.decode() for chunk in chunks]
+
+        heartbeat, change, repeat = async_to_sync(subscribe)()
+        assert heartbeat == ": keep-alive\n\n"
+        assert change.startswith(f"id: {late_id}\nevent: updated")
+        assert repeat == ": keep-alive\n\n"
+
+    def test_slow_subscriber_is_disconnected(self, settings, create_events):
+        settings.EVENT_CHANGES_HEARTBEAT = 5
+        settings.EVENT_CHANGES_SUBSCRIBER_BUFFER = 1
+
+        async def subscribe():
+            stream = stream_changes(None)
+            pending = asyncio.ensure_future(anext(stream))
+            await asyncio.sleep(0.1)
+            changes = await sync_to_async(publish_event_changes)(
+                [EventChange(event=create_events[0], kind=EventChange.Kind.UPDATED) for _ in range(2)]
+            )
+            await listener._poll()
+            chunks = [await pending] + [chunk async for chunk in stream]
+            await listener.stop()
+            return changes, chunks
+
+        changes, chunks = async_to_sync(subscribe)()
+        assert [chunk.split("\n")[0] for chunk in chunks] == [f"id: {changes[0].id}"]
+
+    def test_feed_rejects_invalid_last_event_id(self, async_client):
+        response = get(async_client, reverse("async-event-changes"), {"last_event_id": "abc"})
+        assert response.status_code == 400
+
+    def test_feed_is_not_served_under_wsgi(self, client):
+        assert client.get(reverse("async-event-changes")).status_code == 404
+
+
+@pytest.mark.django_db(transaction=True)
+def test_feed_pushes_committed_changes(settings, async_client, create_events):
+    settings.EVENT_CHANGES_HEARTBEAT = 5
+
+    async def subscribe():
+        response = await async_client.get(reverse("async-event-changes"))
+        stream = asyncio.ensure_future(read_stream(response, 1))
+        await asyncio.sleep(0.5)
+        await sync_to_async(publish_event_change)(create_events[0].id, EventChange.Kind.CANCELED)
+        return await asyncio.wait_for(stream, 5)
+
+    (change,) = async_to_sync(subscribe)()
+    assert "event: canceled" in change
+
+
+@pytest.mark.django_db(transaction=True)
+def test_feed_reads_each_change_once_for_all_subscribers(settings, async_client, create_events):
+    settings.EVENT_CHANGES_HEARTBEAT = 5
+    settings.EVENT_CHANGES_POLL_INTERVAL = 5
+
+    async def subscribe():
+        responses = [await async_client.get(reverse("async-event-changes")) for _ in range(3)]
+        streams = [asyncio.ensure_future(anext(aiter(response.streaming_content))) for response in responses]
+        await asyncio.sleep(0.5)
+        with patch.object(listener, "_fetch", wraps=listener._fetch) as fetch:
+            await sync_to_async(publish_event_change)(create_events[0].id, EventChange.Kind.CANCELED)
+            chunks = await asyncio.wait_for(asyncio.gather(*streams), 5)
+        await listener.stop()
+        return chunks, fetch.call_count
+
+    chunks, fetches = async_to_sync(subscribe)()
+    assert all(b"event: canceled" in chunk for chunk in chunks)
+    # One poll reads the late changes and the new page, however many streams are open.
+    assert fetches == 2
@@ -0,0 +1,129 @@
+import os
+import statistics
+import time
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from events.cache import invalidate_all_events
+from events.models import Event
+from rest_framework.test import APIClient
+
+# Per-endpoint budgets: (max queries, median latency in ms) measured with a cold response cache. Query budgets are exact
+# regression guards and include the savepoints that wrap writes inside the test transaction. Latency depends on the
+# machine, so it is only checked when BENCHMARK_LATENCY_FACTOR is set, scaling the budgets (1 keeps them as they are).
+BUDGETS = {
+    "list": (2, 150),
+    "retrieve": (1, 50),
+    "attendees": (2, 100),
+    # Attending and leaving again, so every round starts from the same state.
+    "attende": (26, 300),
+    # Includes the UPDATE that resets the event before each round.
+    "cancel": (13, 150),
+}
+LATENCY_FACTOR = os.environ.get("BENCHMARK_LATENCY_FACTOR")
+ROUNDS = 5
+
+
+@pytest.fixture
+def dataset():
+    call_command("seed_benchmark", users=50, events=200, max_attendees=40, batch_size=100, stdout=StringIO())
+    return Event.objects.filter(status=Event.Status.INCOMING).select_related("owner").order_by("-attendee_count")
+
+
+@pytest.fixture
+def owner_client(dataset):
+    event = dataset.first()
+    client = APIClient()
+    tokens = client.post(reverse("customuser-token"), {"username": event.owner.username, "password": "benchmark"})
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens.data['access']}")
+    # Warm the token user cache so budgets measure the endpoint, not the first authentication.
+    client.get(reverse("event-detail", kwargs={"pk": event.pk}))
+    return client, event
+
+
+def run_benchmark(name, request):
+    max_queries, latency_ms = BUDGETS[name]
+    timings = []
+    for _ in range(ROUNDS):
+        invalidate_all_events()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = request()
+            timings.append((time.perf_counter() - started) * 1000)
+        assert response.status_code < 400, response.content
+        assert len(queries) <= max_queries, f"{name} ran {len(queries)} queries (budget {max_queries})"
+    if LATENCY_FACTOR:
+        median, budget = statistics.median(timings), latency_ms * float(LATENCY_FACTOR)
+        assert median <= budget, f"{name} took {median:.1f}ms (budget {budget:.0f}ms)"
+
+
+@pytest.mark.django_db
+class TestEndpointBudgets:
+
+    def test_list(self, owner_client):
+        client, _ = owner_client
+        run_benchmark("list", lambda: client.get(reverse("event-list"), {"page_size": 50}))
+
+    def test_retrieve(self, owner_client):
+        client, event = owner_client
+        run_benchmark("retrieve", lambda: client.get(reverse("event-detail", kwargs={"pk": event.pk})))
+
+    def test_attendees(self, owner_client):
+        client, event = owner_client
+        run_benchmark("attendees", lambda: client.get(reverse("event-attendees", kwargs={"pk": event.pk})))
+
+    def test_attende(self, owner_client):
+        client, event = owner_client
+        event.attendees.remove(event.owner)
+
+        def attende_and_leave():
+            client.post(reverse("event-attende", kwargs={"pk": event.pk}))
+            return client.post(reverse("event-remove-attendee", kwargs={"pk": event.pk}))
+
+        run_benchmark("attende", attende_and_leave)
+
+    def test_cancel(self, owner_client):
+        client, event = owner_client
+
+        def cancel():
+            Event.objects.filter(pk=event.pk).update(status=Event.Status.INCOMING)
+            return client.post(reverse("event-cancel", kwargs={"pk": event.pk}))
+
+        run_benchmark("cancel", cancel)
+
+
+@pytest.mark.django_db
+def test_seed_benchmark_keeps_attendee_counts_consistent(dataset):
+    assert dataset.model.objects.count() == 200
+    for event in Event.objects.all():
+        assert event.attendee_count == event.attendees.count()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_loadtest_reports_percentiles_and_queries(dataset):
+    output = StringIO()
+    call_command("loadtest", concurrency=2, requests=20, mix="list=1,retrieve=1,attendees=1,attende=1", stdout=output)
+    lines = output.getvalue().splitlines()
+    assert lines[0].split() == ["scenario", "requests", "errors", "p50", "ms", "p99", "ms", "queries"]
+    assert {line.split()[0] for line in lines[1:-1]} <= {"list", "retrieve", "attendees", "attende"}
+    assert all(line.split()[2] == "0" for line in lines[1:-1])
+    assert " requests in " in lines[-1]
+
+
+@pytest.mark.skipif(
+    not os.environ.get("BENCHMARK_NOTIFICATIONS"),
+    reason="Starts a Celery worker; set BENCHMARK_NOTIFICATIONS=1 to run.",
+)
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_notifications_delivers_every_message():
+    output = StringIO()
+    call_command("benchmark_notifications", attendees=30, chunk_size=10, pool="solo", concurrency="1", stdout=output)
+    header, row = output.getvalue().splitlines()
+    assert header.split()[:5] == ["pool", "workers", "messages", "msg/s", "queries/msg"]
+    pool, workers, messages, _, queries_per_message, *_ = row.split()
+    assert (pool, workers, messages) == ("solo", "1", "30")
+    assert float(queries_per_message) > 0
@@ -1,15 +1,39 @@
+import json
+import threading
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
 from unittest.mock import patch
 
 import pytest
+from celery.exceptions import Retry
+from common.utils import advisory_lock
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.files.storage import default_storage
+from django.core.mail import EmailMessage
+from django.db import connection
 from django.utils import timezone
-from events.models import Event, Notification
-from events.tasks import send_notification_to_all_attendees
+from events.models import Event, EventChange, ExportJob, Notification, NotificationDelivery, PendingNotification
+from events.tasks import (
+    export_attendees, export_events, finish_event, flush_pending_notifications, prune_event_changes,
+    reconcile_attendee_counts, retry_failed_deliveries, schedule_due_event_finishes, send_notification_chunk,
+    send_notification_to_all_attendees, update_event_statuses,
+)
+
+from meetmaster.celery import app as celery_app
 
 User = get_user_model()
 
 
+@pytest.fixture
+def celery_eager():
+    celery_app.conf.task_always_eager = True
+    celery_app.conf.task_eager_propagates = True
+    yield
+    celery_app.conf.task_always_eager = False
+    celery_app.conf.task_eager_propagates = False
+
+
 @pytest.fixture
 def create_users():
     user1 = User.objects.create_user(username="user1", email="user1@example.com", password="password123")
@@ -32,41 +56,304 @@ def event(create_users):
 
 
 @pytest.mark.django_db
-@patch("events.tasks.send_mail")
-def test_send_notification_to_all_attendees(mock_send_mail, event, create_users):
+def test_send_notification_to_all_attendees(celery_eager, event, create_users):
     user1, user2 = create_users
     message = "This is a test notification."
     subject = "Test Subject"
     send_notification_to_all_attendees(event.id, message, subject)
 
-    assert mock_send_mail.call_count == 2
-
-    mock_send_mail.assert_any_call(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user1.email],
-        fail_silently=False,
-    )
-    mock_send_mail.assert_any_call(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user2.email],
-        fail_silently=False,
-    )
+    assert len(mail.outbox) == 2
+    assert sorted(email.to[0] for email in mail.outbox) == [user1.email, user2.email]
+    for email in mail.outbox:
+        assert email.subject == subject
+        assert email.body == message
+        assert email.from_email == settings.DEFAULT_FROM_EMAIL
 
-    assert Notification.objects.filter(event=event, message=message).exists()
+    notification = Notification.objects.get(event=event, message=message)
+    assert notification.deliveries.filter(status=NotificationDelivery.Status.SENT).count() == 2
 
 
 @pytest.mark.django_db
-@patch("events.tasks.send_mail")
-def test_send_notification_to_all_attendees_no_attendees(mock_send_mail, event):
+def test_send_notification_to_all_attendees_no_attendees(celery_eager, event):
     event.attendees.clear()
     message = "This is a test notification."
     subject = "Test Subject"
     send_notification_to_all_attendees(event.id, message, subject)
 
-    assert mock_send_mail.call_count == 0
+    assert len(mail.outbox) == 0
 
     assert Notification.objects.filter(event=event, message=message).exists()
+
+
+@pytest.fixture
+def deliveries(event, create_users):
+    user3 = User.objects.create_user(username="user3", email="user3@example.com", password="password123")
+    notification = Notification.objects.create(event=event, subject="subject", message="message")
+    return [
+        NotificationDelivery.objects.create(notification=notification, recipient=recipient)
+        for recipient in [*create_users, user3]
+    ]
+
+
+@pytest.mark.django_db
+@patch("events.tasks.group")
+def test_send_notification_to_all_attendees_splits_in_chunks(mock_group, event, create_users):
+    user1, user2 = create_users
+    assert send_notification_to_all_attendees(event.id, "message", "subject", chunk_size=1) == 2
+
+    chunks = [signature.args[0] for signature in mock_group.call_args.args[0]]
+    recipients = [NotificationDelivery.objects.get(id=delivery_ids[0]).recipient for delivery_ids in chunks]
+    assert recipients == [user1, user2]
+    mock_group.return_value.apply_async.assert_called_once()
+
+
+@pytest.mark.django_db
+def test_send_notification_chunk_skips_refused_recipients(deliveries):
+    refused = SMTPRecipientsRefused({"user2@example.com": (550, b"No such user")})
+    with patch.object(EmailMessage, "send", side_effect=[1, refused, 1]):
+        result = send_notification_chunk([delivery.id for delivery in deliveries])
+
+    assert result == {"sent": 2, "rejected": 1, "failed": 0}
+    statuses = [NotificationDelivery.objects.get(id=delivery.id).status for delivery in deliveries]
+    assert statuses == [
+        NotificationDelivery.Status.SENT,
+        NotificationDelivery.Status.REJECTED,
+        NotificationDelivery.Status.SENT,
+    ]
+
+
+@pytest.mark.django_db
+def test_send_notification_chunk_retries_only_pending_deliveries(deliveries):
+    delivery_ids = [delivery.id for delivery in deliveries]
+    with (
+        patch.object(EmailMessage, "send", side_effect=[1, SMTPServerDisconnected()]),
+        patch.object(send_notification_chunk, "retry", side_effect=Retry()) as mock_retry,
+    ):
+        with pytest.raises(Retry):
+            send_notification_chunk(delivery_ids)
+
+    assert mock_retry.call_args.kwargs["args"] == (delivery_ids[1:],)
+    assert 0 <= mock_retry.call_args.kwargs["countdown"] <= send_notification_chunk.default_retry_delay
+    assert NotificationDelivery.objects.get(id=delivery_ids[0]).status == NotificationDelivery.Status.SENT
+    retrying = NotificationDelivery.objects.get(id=delivery_ids[1])
+    assert (retrying.status, retrying.attempts) == (NotificationDelivery.Status.PENDING, 1)
+
+
+@pytest.mark.django_db
+def test_send_notification_chunk_fails_deliveries_once_out_of_retries(deliveries):
+    delivery_ids = [delivery.id for delivery in deliveries]
+    with (
+        patch.object(EmailMessage, "send", side_effect=SMTPServerDisconnected()),
+        patch.object(send_notification_chunk, "retry") as mock_retry,
+    ):
+        result = send_notification_chunk.apply(args=[delivery_ids], retries=send_notification_chunk.max_retries).get()
+
+    assert result == {"sent": 0, "rejected": 0, "failed": 3}
+    mock_retry.assert_not_called()
+    assert set(NotificationDelivery.objects.values_list("status", flat=True)) == {NotificationDelivery.Status.FAILED}
+
+
+@pytest.mark.django_db
+def test_send_notification_chunk_does_not_resend_sent_deliveries(deliveries):
+    NotificationDelivery.objects.filter(id=deliveries[0].id).update(status=NotificationDelivery.Status.SENT)
+
+    send_notification_chunk([delivery.id for delivery in deliveries])
+
+    assert sorted(email.to[0] for email in mail.outbox) == ["user2@example.com", "user3@example.com"]
+
+
+@pytest.mark.django_db
+def test_send_notification_chunk_skips_deliveries_leased_by_another_run(deliveries):
+    leased_until = timezone.now() + timezone.timedelta(minutes=5)
+    NotificationDelivery.objects.filter(id=deliveries[0].id).update(leased_until=leased_until)
+
+    assert send_notification_chunk([delivery.id for delivery in deliveries])["sent"] == 2
+    assert send_notification_chunk([delivery.id for delivery in deliveries])["sent"] == 0
+    assert sorted(email.to[0] for email in mail.outbox) == ["user2@example.com", "user3@example.com"]
+
+
+@pytest.mark.django_db
+@patch("events.tasks.group")
+def test_retry_failed_deliveries_targets_failed_recipients(mock_group, deliveries):
+    NotificationDelivery.objects.filter(id=deliveries[1].id).update(status=NotificationDelivery.Status.FAILED)
+
+    assert retry_failed_deliveries(deliveries[0].notification_id) == 1
+    assert mock_group.call_args.args[0][0].args == ([deliveries[1].id],)
+    assert NotificationDelivery.objects.get(id=deliveries[1].id).status == NotificationDelivery.Status.PENDING
+    assert retry_failed_deliveries(deliveries[0].notification_id) == 0
+
+
+@pytest.mark.django_db
+def test_reconcile_attendee_counts_repairs_drift(event):
+    Event.objects.filter(pk=event.pk).update(attendee_count=7)
+
+    assert reconcile_attendee_counts() == 1
+    event.refresh_from_db()
+    assert event.attendee_count == 2
+    assert reconcile_attendee_counts() == 0
+
+
+@pytest.mark.django_db
+def test_update_event_statuses_finishes_past_incoming_events(event, create_users):
+    def create_event(days, status=Event.Status.INCOMING):
+        return Event.objects.create(
+            title="Event",
+            description="Description",
+            date=timezone.now() + timezone.timedelta(days=days),
+            location="Location",
+            owner=create_users[0],
+            status=status,
+        )
+
+    past_events = [create_event(-1), create_event(-2), create_event(-3)]
+    canceled = create_event(-1, Event.Status.CANCELED)
+
+    result = update_event_statuses(batch_size=2)
+
+    assert result["transitioned"] == 3
+    assert all(
+        event.status == Event.Status.FINISHED for event in Event.objects.filter(pk__in=[e.pk for e in past_events])
+    )
+    canceled.refresh_from_db()
+    event.refresh_from_db()
+    assert canceled.status == Event.Status.CANCELED
+    assert event.status == Event.Status.INCOMING
+    changes = EventChange.objects.filter(kind=EventChange.Kind.FINISHED)
+    assert sorted(changes.values_list("event_id", flat=True)) == sorted(e.pk for e in past_events)
+
+
+@pytest.mark.django_db
+def test_update_event_statuses_skips_when_already_running(event):
+    Event.objects.filter(pk=event.pk).update(date=timezone.now() - timezone.timedelta(days=1))
+    held, finished = threading.Event(), threading.Event()
+
+    def other_run():
+        # Another worker, on its own database connection.
+        with advisory_lock("events:update_event_statuses"):
+            held.set()
+            finished.wait(10)
+        connection.close()
+
+    worker = threading.Thread(target=other_run)
+    worker.start()
+    try:
+        assert held.wait(10)
+        assert update_event_statuses() is None
+    finally:
+        finished.set()
+        worker.join()
+    event.refresh_from_db()
+    assert event.status == Event.Status.INCOMING
+    assert update_event_statuses()["transitioned"] == 1
+
+
+@pytest.mark.django_db
+def test_finish_event_only_finishes_events_that_are_due(event):
+    assert finish_event(event.id) == 0
+
+    Event.objects.filter(pk=event.pk).update(date=timezone.now() - timezone.timedelta(seconds=1))
+    assert finish_event(event.id) == 1
+    event.refresh_from_db()
+    assert event.status == Event.Status.FINISHED
+
+
+@pytest.mark.django_db
+@patch("events.tasks.finish_event.apply_async")
+def test_schedule_due_event_finishes_enqueues_events_within_horizon(mock_apply_async, event):
+    soon = timezone.now() + timezone.timedelta(minutes=5)
+    Event.objects.filter(pk=event.pk).update(date=soon)
+    # Left to the next run, which would otherwise schedule it a second time.
+    next_run = timezone.now() + timezone.timedelta(seconds=settings.EVENT_FINISH_SCHEDULE_HORIZON + 60)
+    Event.objects.create(title="Next", description="Next", date=next_run, location="Here", owner=event.owner)
+
+    assert schedule_due_event_finishes() == 1
+    mock_apply_async.assert_called_once_with((event.id,), eta=soon)
+
+
+@pytest.mark.django_db
+@patch("events.tasks.send_notification_to_all_attendees.delay")
+def test_flush_pending_notifications_sends_due_messages_in_one_batch(mock_delay, celery_eager, event, create_users):
+    user1, user2 = create_users
+    now = timezone.now()
+    PendingNotification.objects.create(event=event, subject="Canceled", message="Event canceled", due_at=now)
+    for user in create_users:
+        PendingNotification.objects.create(
+            event=event, recipient=user, subject="Added", message="You were added", due_at=now
+        )
+    PendingNotification.objects.create(
+        event=Event.objects.create(
+            title="Later", description="Later", date=now + timezone.timedelta(days=1), location="Here", owner=user1
+        ),
+        subject="Later",
+        message="Not due yet",
+        due_at=now + timezone.timedelta(minutes=1),
+    )
+
+    assert flush_pending_notifications() == 3
+
+    mock_delay.assert_called_once_with(event.id, "Event canceled", "Canceled")
+    assert sorted(email.to[0] for email in mail.outbox) == [user1.email, user2.email]
+    assert Notification.objects.get(message="You were added").deliveries.count() == 2
+    assert PendingNotification.objects.get().message == "Not due yet"
+
+
+@pytest.mark.django_db
+@patch("events.tasks.group")
+def test_flush_pending_notifications_requeues_stale_deliveries(mock_group, deliveries):
+    stale = timezone.now() - timezone.timedelta(seconds=settings.NOTIFICATION_DELIVERY_STALE_AFTER + 1)
+    NotificationDelivery.objects.update(updated=stale)
+    NotificationDelivery.objects.filter(id=deliveries[1].id).update(status=NotificationDelivery.Status.SENT)
+    # Still being sent by a live chunk task.
+    leased_until = timezone.now() + timezone.timedelta(minutes=5)
+    NotificationDelivery.objects.filter(id=deliveries[2].id).update(leased_until=leased_until)
+
+    assert flush_pending_notifications() == 0
+    assert mock_group.call_args.args[0][0].args == ([deliveries[0].id],)
+
+    mock_group.reset_mock()
+    flush_pending_notifications()
+    mock_group.assert_not_called()
+
+
+@pytest.mark.django_db
+def test_export_tasks_write_files_to_storage(settings, tmp_path, event, create_users):
+    settings.MEDIA_ROOT = tmp_path
+    user1, user2 = create_users
+
+    path = export_attendees(event.id, "csv", "exports/attendees.csv")
+    with default_storage.open(path) as file:
+        assert file.read().decode().splitlines() == ["id,username", f"{user1.id},user1", f"{user2.id},user2"]
+
+    path = export_events(user2.id, {}, "ndjson", "exports/events.ndjson")
+    with default_storage.open(path) as file:
+        assert file.read() == b""
+    path = export_events(user1.id, {"status": "IN"}, "ndjson", "exports/events.ndjson")
+    with default_storage.open(path) as file:
+        assert [row["id"] for row in map(json.loads, file.read().splitlines())] == [event.id]
+
+
+@pytest.mark.django_db
+def test_export_tasks_record_the_outcome_on_their_job(settings, tmp_path, event, create_users):
+    settings.MEDIA_ROOT = tmp_path
+    job = ExportJob.objects.create(requested_by=create_users[0], path="exports/attendees.csv")
+
+    path = export_attendees(event.id, "csv", job.path, job_id=str(job.id))
+    job.refresh_from_db()
+    assert job.status == ExportJob.Status.READY
+    assert job.path == path
+
+    job = ExportJob.objects.create(requested_by=create_users[0], path="exports/attendees.csv")
+    with patch("events.tasks.write_export", side_effect=OSError), pytest.raises(OSError):
+        export_attendees(event.id, "csv", job.path, job_id=str(job.id))
+    job.refresh_from_db()
+    assert job.status == ExportJob.Status.FAILED
+
+
+@pytest.mark.django_db
+def test_prune_event_changes_drops_expired_changes(event):
+    expired = EventChange.objects.create(event=event, kind=EventChange.Kind.UPDATED)
+    EventChange.objects.filter(pk=expired.pk).update(created=timezone.now() - timezone.timedelta(days=2))
+    recent = EventChange.objects.create(event=event, kind=EventChange.Kind.CANCELED)
+
+    assert prune_event_changes() == 1
+    assert list(EventChange.objects.all()) == [recent]
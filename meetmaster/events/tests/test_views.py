@@ -1,11 +1,18 @@
+import json
 from datetime import date
+from types import SimpleNamespace
 from unittest.mock import patch
 
 import pytest
+from common.models import OutboxTask
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
-from events.models import Event
+from events.models import Event, EventChange, ExportJob, Notification, NotificationDelivery, PendingNotification
+from events.serializers import EventAttendeeSerializer
+from events.tasks import export_events
 from rest_framework import status
 from rest_framework.test import APIClient
 
@@ -35,8 +42,8 @@ def create_event(create_users):
 
 
 @pytest.fixture
-def mock_send_notification_to_all_attendees():
-    with patch("events.tasks.send_notification_to_all_attendees.delay") as mock:
+def mock_queue_notification():
+    with patch("events.serializers.queue_notification") as mock:
         yield mock
 
 
@@ -128,6 +135,18 @@ class TestEventViewSet:
         assert create_event.location == "Updated location"
         assert create_event.date == updated_date
 
+    def test_date_change_schedules_event_finish_through_outbox(self, api_client, create_users, create_event):
+        login(api_client, create_users["user1"].username, "password")
+        soon = timezone.now() + timezone.timedelta(minutes=5)
+        patch_event(api_client, create_event.pk, {"date": soon})
+        outbox_task = OutboxTask.objects.get()
+        assert outbox_task.task_name == "events.tasks.finish_event"
+        assert outbox_task.args == [create_event.pk]
+        assert outbox_task.eta == soon
+
+        patch_event(api_client, create_event.pk, {"date": soon + timezone.timedelta(days=7)})
+        assert OutboxTask.objects.count() == 1
+
     def test_auth_user_cannot_update_event_with_past_date(self, api_client, create_users, create_event):
         user1 = create_users["user1"]
         login(api_client, user1.username, "password")
@@ -155,32 +174,155 @@ class TestEventViewSet:
         assert response.status_code == status.HTTP_200_OK
         create_event.refresh_from_db()
         assert create_event.status == Event.Status.CANCELED
+        assert EventChange.objects.get(event=create_event).kind == EventChange.Kind.CANCELED
 
-    def test_not_notified_twice_on_double_cancel(
-        self, api_client, create_users, create_event, mock_send_notification_to_all_attendees
-    ):
+    def test_not_notified_twice_on_double_cancel(self, api_client, create_users, create_event, mock_queue_notification):
         user1 = create_users["user1"]
         login(api_client, user1.username, "password")
         api_client.post(reverse("event-cancel", kwargs={"pk": create_event.pk}))
         create_event.refresh_from_db()
 
-        mock_send_notification_to_all_attendees.assert_called_once()
-        mock_send_notification_to_all_attendees.reset_mock()
+        mock_queue_notification.assert_called_once()
+        mock_queue_notification.reset_mock()
 
         api_client.post(reverse("event-cancel", kwargs={"pk": create_event.pk}))
         create_event.refresh_from_db()
 
-        mock_send_notification_to_all_attendees.assert_not_called()
+        mock_queue_notification.assert_not_called()
+
+    def test_rapid_date_changes_are_coalesced_into_latest_notification(self, api_client, create_users, create_event):
+        login(api_client, create_users["user1"].username, "password")
+        for days in [2, 3, 4]:
+            patch_event(api_client, create_event.pk, {"date": create_event.date + timezone.timedelta(days=days)})
+
+        create_event.refresh_from_db()
+        pending = PendingNotification.objects.get(event=create_event)
+        assert pending.recipient is None
+        assert str(create_event.date) in pending.message
+        changes = EventChange.objects.filter(event=create_event, kind=EventChange.Kind.DATE_CHANGED)
+        assert changes.count() == 3
 
     def test_any_user_can_list_events(self, api_client):
         response = api_client.get(reverse("event-list"))
         assert response.status_code == status.HTTP_200_OK
 
+    def test_list_events_runs_constant_number_of_queries(self, api_client, create_users, django_assert_max_num_queries):
+        for index in range(8):
+            event = Event.objects.create(
+                title=f"Event {index}",
+                description="Description",
+                date=timezone.now() + timezone.timedelta(days=index + 1),
+                location="Location",
+                owner=create_users["user1"],
+            )
+            event.attendees.add(create_users["user1"], create_users["user2"])
+        with django_assert_max_num_queries(2):
+            response = api_client.get(reverse("event-list"))
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_list_events_uses_cursor_pagination(self, api_client, create_users):
+        for index in range(3):
+            Event.objects.create(
+                title=f"Event {index}",
+                description="Description",
+                date=timezone.now() + timezone.timedelta(days=index + 1),
+                location="Location",
+                owner=create_users["user1"],
+            )
+        response = api_client.get(reverse("event-list"), {"page_size": 2})
+        assert [event["title"] for event in response.data["results"]] == ["Event 2", "Event 1"]
+        assert "count" not in response.data
+
+        response = api_client.get(response.data["next"])
+        assert [event["title"] for event in response.data["results"]] == ["Event 0"]
+        assert response.data["next"] is None
+
+    def test_list_events_can_be_filtered(self, api_client, create_users):
+        owner = create_users["user1"]
+        tomorrow = timezone.now() + timezone.timedelta(days=1)
+        Event.objects.create(
+            title="Python meetup",
+            description="Talks about Django",
+            date=tomorrow,
+            location="Porto Alegre",
+            owner=owner,
+        )
+        Event.objects.create(
+            title="Rust meetup",
+            description="Talks about async",
+            date=tomorrow + timezone.timedelta(days=30),
+            location="Sao Paulo",
+            owner=create_users["user2"],
+            status=Event.Status.CANCELED,
+        )
+
+        def titles(params):
+            response = api_client.get(reverse("event-list"), params)
+            assert response.status_code == status.HTTP_200_OK
+            return [event["title"] for event in response.data["results"]]
+
+        assert titles({"location": "porto"}) == ["Python meetup"]
+        assert titles({"status": Event.Status.CANCELED}) == ["Rust meetup"]
+        assert titles({"owner": owner.pk}) == ["Python meetup"]
+        assert titles({"date_after": tomorrow + timezone.timedelta(days=1)}) == ["Rust meetup"]
+        assert titles({"date_before": tomorrow + timezone.timedelta(days=1)}) == ["Python meetup"]
+        assert titles({"search": "django"}) == ["Python meetup"]
+
+    def test_list_events_rejects_invalid_filters(self, api_client):
+        response = api_client.get(reverse("event-list"), {"status": "XX"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_total_attendees_follows_attende_and_remove(self, api_client, create_users, create_event):
+        user2 = create_users["user2"]
+        login(api_client, user2.username, "password")
+        api_client.post(reverse("event-attende", kwargs={"pk": create_event.pk}))
+        assert get_event(api_client, create_event.pk).data["total_attendees"] == 1
+
+        api_client.post(reverse("event-remove-attendee", kwargs={"pk": create_event.pk}))
+        assert get_event(api_client, create_event.pk).data["total_attendees"] == 0
+
     def test_can_retrieve_event_details(self, api_client, create_event):
         response = get_event(api_client, create_event.pk)
         assert response.status_code == status.HTTP_200_OK
         assert response.data["title"] == create_event.title
 
+    def test_event_detail_is_served_from_cache(self, api_client, create_event, django_assert_num_queries):
+        get_event(api_client, create_event.pk)
+        with django_assert_num_queries(0):
+            response = get_event(api_client, create_event.pk)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["title"] == create_event.title
+
+    def test_event_update_invalidates_cached_responses(self, api_client, create_users, create_event):
+        get_event(api_client, create_event.pk)
+        api_client.get(reverse("event-list"))
+        login(api_client, create_users["user1"].username, "password")
+        patch_event(api_client, create_event.pk, {"title": "Renamed"})
+        api_client.logout()
+
+        assert get_event(api_client, create_event.pk).data["title"] == "Renamed"
+        assert api_client.get(reverse("event-list")).data["results"][0]["title"] == "Renamed"
+
+    def test_padded_event_id_shares_the_cached_detail(self, api_client, create_users, create_event):
+        padded_url = reverse("event-detail", kwargs={"pk": f"0{create_event.pk}"})
+        assert api_client.get(padded_url).data["title"] == create_event.title
+        login(api_client, create_users["user1"].username, "password")
+        patch_event(api_client, create_event.pk, {"title": "Renamed"})
+        api_client.logout()
+
+        assert api_client.get(padded_url).data["title"] == "Renamed"
+        assert api_client.get(reverse("event-detail", kwargs={"pk": "abc"})).status_code == status.HTTP_404_NOT_FOUND
+
+    def test_superuser_can_view_cache_stats(self, api_client, create_event):
+        get_user_model().objects.create_superuser(username="admin", email="admin@mail.com", password="password")
+        get_event(api_client, create_event.pk)
+        get_event(api_client, create_event.pk)
+        login(api_client, "admin", "password")
+        response = api_client.get(reverse("event-cache-stats"))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["hits"] == 1
+        assert response.data["misses"] == 1
+
     def test_auth_user_can_attende_to_event(self, api_client, create_users, create_event):
         user2 = create_users["user2"]
         login(api_client, user2.username, "password")
@@ -189,6 +331,39 @@ class TestEventViewSet:
         create_event.refresh_from_db()
         assert user2 in create_event.attendees.all()
 
+    def test_cannot_attende_to_event_at_full_capacity(self, api_client, create_users, create_event):
+        create_event.capacity = 1
+        create_event.attendee_count = 1
+        create_event.save()
+        user2 = create_users["user2"]
+        login(api_client, user2.username, "password")
+        response = api_client.post(reverse("event-attende", kwargs={"pk": create_event.pk}))
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not create_event.attendees.filter(pk=user2.pk).exists()
+
+    def test_racing_rsvps_of_same_user_take_one_seat(self, create_users, create_event):
+        # Both requests passed the view's is_attendee check before either inserted the attendee row.
+        serializer = EventAttendeeSerializer(context={"request": SimpleNamespace(user=create_users["user2"])})
+        serializer.add_attendee(create_event)
+        serializer.add_attendee(create_event)
+        create_event.refresh_from_db()
+        assert create_event.attendee_count == 1
+        assert PendingNotification.objects.count() == 1
+
+        serializer.remove_attendee(create_event)
+        serializer.remove_attendee(create_event)
+        create_event.refresh_from_db()
+        assert create_event.attendee_count == 0
+        assert not create_event.attendees.exists()
+
+    def test_owner_cannot_set_capacity_below_attendee_count(self, api_client, create_users, create_event):
+        create_event.attendee_count = 2
+        create_event.save()
+        login(api_client, create_users["user1"].username, "password")
+        response = patch_event(api_client, create_event.pk, {"capacity": 1})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "capacity" in response.data
+
     def test_unauth_user_cannot_attende(self, api_client, create_event):
         response = api_client.post(reverse("event-attende", kwargs={"pk": create_event.pk}))
         assert response.status_code == status.HTTP_403_FORBIDDEN
@@ -208,8 +383,300 @@ class TestEventViewSet:
         response = api_client.get(reverse("event-attendees", kwargs={"pk": create_event.pk}))
         assert response.status_code == status.HTTP_200_OK
 
+    def test_attendees_are_paginated(self, api_client, create_users, create_event):
+        create_event.attendees.add(create_users["user1"], create_users["user2"])
+        login(api_client, create_users["user1"].username, "password")
+        url = reverse("event-attendees", kwargs={"pk": create_event.pk})
+        response = api_client.get(url, {"page_size": 1})
+        assert response.data["results"] == [{"id": create_users["user1"].id, "username": "user1"}]
+
+        response = api_client.get(response.data["next"])
+        assert response.data["results"] == [{"id": create_users["user2"].id, "username": "user2"}]
+        assert response.data["next"] is None
+
+    def test_owner_permission_check_does_not_load_owner(self, api_client, create_users, create_event):
+        login(api_client, create_users["user1"].username, "password")
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(reverse("event-attendees", kwargs={"pk": create_event.pk}))
+        assert response.status_code == status.HTTP_200_OK
+        event_queries = [query for query in queries if 'FROM "events_event" WHERE' in query["sql"]]
+        assert len(event_queries) == 1
+        # The authenticated user and the attendee page; the owner is never loaded for the permission check.
+        user_queries = [query for query in queries if 'FROM "users_customuser"' in query["sql"]]
+        assert len(user_queries) == 2
+
     def test_non_owner_cannot_view_attendees(self, api_client, create_users, create_event):
         user2 = create_users["user2"]
         login(api_client, user2.username, "password")
         response = api_client.get(reverse("event-attendees", kwargs={"pk": create_event.pk}))
         assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_attendee_can_view_attendees_with_single_membership_query(self, api_client, create_users, create_event):
+        user2 = create_users["user2"]
+        create_event.attendees.add(user2)
+        login(api_client, user2.username, "password")
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.get(reverse("event-attendees", kwargs={"pk": create_event.pk}))
+        assert response.status_code == status.HTTP_200_OK
+        membership_queries = [
+            query for query in queries if query["sql"].startswith('SELECT 1 AS "a" FROM "events_event_attendees"')
+        ]
+        assert len(membership_queries) == 1
+
+    def test_owner_can_bulk_add_attendees(self, api_client, create_users, create_event, django_assert_max_num_queries):
+        custom_user = get_user_model()
+        users = [
+            custom_user.objects.create_user(username=f"bulk{i}", email=f"bulk{i}@mail.com", password="password")
+            for i in range(20)
+        ]
+        create_event.attendees.add(users[0])
+        Event.objects.filter(pk=create_event.pk).update(attendee_count=1)
+        login(api_client, create_users["user1"].username, "password")
+        url = reverse("event-bulk-add-attendees", kwargs={"pk": create_event.pk})
+        with django_assert_max_num_queries(15):
+            response = api_client.post(url, {"user_ids": [user.id for user in users]}, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"added": 19}
+        create_event.refresh_from_db()
+        assert create_event.attendee_count == 20
+        assert create_event.attendees.count() == 20
+        assert PendingNotification.objects.filter(event=create_event).count() == 19
+
+    def test_bulk_add_attendees_respects_capacity(self, api_client, create_users, create_event):
+        Event.objects.filter(pk=create_event.pk).update(capacity=1)
+        login(api_client, create_users["user1"].username, "password")
+        url = reverse("event-bulk-add-attendees", kwargs={"pk": create_event.pk})
+        user_ids = [create_users["user1"].id, create_users["user2"].id]
+        response = api_client.post(url, {"user_ids": user_ids}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert create_event.attendees.count() == 0
+
+    def test_bulk_add_attendees_rejects_unknown_users(self, api_client, create_users, create_event):
+        login(api_client, create_users["user1"].username, "password")
+        url = reverse("event-bulk-add-attendees", kwargs={"pk": create_event.pk})
+        response = api_client.post(url, {"user_ids": [create_users["user2"].id, 999999]}, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "user_ids" in response.data
+
+    def test_owner_can_bulk_remove_attendees(self, api_client, create_users, create_event):
+        create_event.attendees.add(create_users["user1"], create_users["user2"])
+        Event.objects.filter(pk=create_event.pk).update(attendee_count=2)
+        login(api_client, create_users["user1"].username, "password")
+        url = reverse("event-bulk-remove-attendees", kwargs={"pk": create_event.pk})
+        response = api_client.post(url, {"user_ids": [create_users["user2"].id]}, format="json")
+        assert response.data == {"removed": 1}
+        create_event.refresh_from_db()
+        assert create_event.attendee_count == 1
+        assert list(create_event.attendees.all()) == [create_users["user1"]]
+
+    def test_bulk_remove_reports_only_attendees_it_removed(self, api_client, create_users, create_event):
+        create_event.attendees.add(create_users["user2"])
+        Event.objects.filter(pk=create_event.pk).update(attendee_count=1)
+        login(api_client, create_users["user1"].username, "password")
+        url = reverse("event-bulk-remove-attendees", kwargs={"pk": create_event.pk})
+        user_ids = [create_users["user1"].id, create_users["user2"].id]
+        response = api_client.post(url, {"user_ids": user_ids}, format="json")
+        assert response.data == {"removed": 1}
+        assert list(PendingNotification.objects.values_list("recipient_id", flat=True)) == [create_users["user2"].id]
+
+    def test_non_owner_cannot_bulk_add_attendees(self, api_client, create_users, create_event):
+        login(api_client, create_users["user2"].username, "password")
+        url = reverse("event-bulk-add-attendees", kwargs={"pk": create_event.pk})
+        response = api_client.post(url, {"user_ids": [create_users["user2"].id]}, format="json")
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_auth_user_can_bulk_create_events(self, api_client, create_users, django_assert_max_num_queries):
+        login(api_client, create_users["user1"].username, "password")
+        data = [
+            {
+                "title": f"Event {i}",
+                "description": "Imported event",
+                "date": (timezone.now() + timezone.timedelta(days=30 + i)).isoformat(),
+                "location": "Location",
+            }
+            for i in range(10)
+        ]
+        with django_assert_max_num_queries(5):
+            response = api_client.post(reverse("event-bulk"), data, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+        assert len(response.data) == 10
+        assert all(event["id"] for event in response.data)
+        assert Event.objects.filter(owner=create_users["user1"]).count() == 10
+
+    def test_bulk_create_rejects_whole_payload_on_invalid_row(self, api_client, create_users):
+        login(api_client, create_users["user1"].username, "password")
+        data = [
+            {"title": "Valid", "description": "Valid", "date": timezone.now() + timezone.timedelta(days=1)},
+            {"title": "Past", "description": "Past", "date": timezone.now() - timezone.timedelta(days=1)},
+        ]
+        for event in data:
+            event.update(location="Location", date=event["date"].isoformat())
+        response = api_client.post(reverse("event-bulk"), data, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data[0] == {}
+        assert "date" in response.data[1]
+        assert not Event.objects.exists()
+
+    def test_owner_can_bulk_update_events(self, api_client, create_users, create_event):
+        other = Event.objects.create(
+            title="Event 2",
+            description="Description for event 2",
+            date=create_event.date,
+            location="Location 2",
+            owner=create_users["user1"],
+        )
+        login(api_client, create_users["user1"].username, "password")
+        new_date = (create_event.date + timezone.timedelta(days=1)).isoformat()
+        data = [{"id": create_event.id, "date": new_date}, {"id": other.id, "title": "Renamed"}]
+        response = api_client.patch(reverse("event-bulk"), data, format="json")
+        assert response.status_code == status.HTTP_200_OK
+        create_event.refresh_from_db()
+        other.refresh_from_db()
+        assert create_event.date.isoformat() == new_date
+        assert other.title == "Renamed"
+        assert list(PendingNotification.objects.values_list("event_id", flat=True)) == [create_event.id]
+
+    def test_bulk_update_requires_ownership_of_every_event(self, api_client, create_users, create_event):
+        other = Event.objects.create(
+            title="Event 2",
+            description="Description for event 2",
+            date=create_event.date,
+            location="Location 2",
+            owner=create_users["user2"],
+        )
+        login(api_client, create_users["user1"].username, "password")
+        data = [{"id": create_event.id, "title": "Mine"}, {"id": other.id, "title": "Not mine"}]
+        response = api_client.patch(reverse("event-bulk"), data, format="json")
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        other.refresh_from_db()
+        assert other.title == "Event 2"
+
+    def test_bulk_update_rejects_unknown_and_duplicate_ids(self, api_client, create_users, create_event):
+        login(api_client, create_users["user1"].username, "password")
+        response = api_client.patch(reverse("event-bulk"), [{"id": 999999, "title": "Missing"}], format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        data = [{"id": create_event.id, "title": "One"}, {"id": create_event.id, "title": "Two"}]
+        response = api_client.patch(reverse("event-bulk"), data, format="json")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_owner_can_stream_events_as_csv(self, api_client, create_users, create_event):
+        Event.objects.create(
+            title="Other",
+            description="Other",
+            date=create_event.date,
+            location="Location",
+            owner=create_users["user2"],
+        )
+        login(api_client, create_users["user1"].username, "password")
+        response = api_client.get(reverse("event-export"))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.streaming
+        assert response["Content-Type"] == "text/csv"
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        assert lines[0].startswith("id,title,description,date")
+        assert len(lines) == 2
+        assert lines[1].startswith(f"{create_event.id},Event 1,")
+
+    def test_event_export_supports_ndjson_and_filters(self, api_client, create_users, create_event):
+        login(api_client, create_users["user1"].username, "password")
+        response = api_client.get(reverse("event-export"), {"type": "ndjson", "location": "location 1"})
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        assert [row["id"] for row in rows] == [create_event.id]
+
+        response = api_client.get(reverse("event-export"), {"type": "ndjson", "location": "elsewhere"})
+        assert b"".join(response.streaming_content) == b""
+
+    def test_large_event_export_can_run_in_background(self, api_client, create_users, create_event):
+        login(api_client, create_users["user1"].username, "password")
+        response = api_client.get(reverse("event-export"), {"background": "true", "status": "IN"})
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data["status"] == "pending"
+        assert response.data["download"] is None
+        job = ExportJob.objects.get(id=response.data["id"])
+        task = OutboxTask.objects.get(task_name="events.tasks.export_events")
+        assert task.args == [create_users["user1"].id, {"status": "IN"}, "csv", job.path]
+        assert task.kwargs == {"job_id": str(job.id)}
+
+    def test_background_export_can_be_downloaded_by_its_requester(
+        self, api_client, create_users, create_event, settings, tmp_path
+    ):
+        settings.MEDIA_ROOT = tmp_path
+        login(api_client, create_users["user1"].username, "password")
+        response = api_client.get(reverse("event-export"), {"background": "true"})
+        job = ExportJob.objects.get(id=response.data["id"])
+
+        assert api_client.get(response.data["url"]).data["status"] == "pending"
+        download_url = reverse("event-export-download", kwargs={"job_id": job.id.hex})
+        assert api_client.get(download_url).status_code == status.HTTP_409_CONFLICT
+
+        export_events(create_users["user1"].id, {}, "csv", job.path, job_id=str(job.id))
+        response = api_client.get(response.data["url"])
+        assert response.data["status"] == "ready"
+        response = api_client.get(response.data["download"])
+        assert response["Content-Type"] == "text/csv"
+        assert response["Content-Disposition"].startswith("attachment;")
+        assert b"".join(response.streaming_content).decode().splitlines()[1].startswith(f"{create_event.id},")
+
+        login(api_client, create_users["user2"].username, "password")
+        assert api_client.get(download_url).status_code == status.HTTP_404_NOT_FOUND
+
+    def test_owner_can_export_attendee_roster(self, api_client, create_users, create_event):
+        create_event.attendees.add(create_users["user1"], create_users["user2"])
+        login(api_client, create_users["user1"].username, "password")
+        response = api_client.get(reverse("event-export-attendees", kwargs={"pk": create_event.pk}))
+        assert b"".join(response.streaming_content).decode().splitlines() == [
+            "id,username",
+            f"{create_users['user1'].id},user1",
+            f"{create_users['user2'].id},user2",
+        ]
+
+    def test_attendee_cannot_export_attendee_roster(self, api_client, create_users, create_event):
+        create_event.attendees.add(create_users["user2"])
+        login(api_client, create_users["user2"].username, "password")
+        response = api_client.get(reverse("event-export-attendees", kwargs={"pk": create_event.pk}))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+class TestNotificationViewSet:
+
+    @pytest.fixture
+    def notification(self, create_users, create_event):
+        notification = Notification.objects.create(event=create_event, subject="subject", message="message")
+        NotificationDelivery.objects.create(
+            notification=notification, recipient=create_users["user1"], status=NotificationDelivery.Status.SENT
+        )
+        NotificationDelivery.objects.create(
+            notification=notification, recipient=create_users["user2"], status=NotificationDelivery.Status.FAILED
+        )
+        return notification
+
+    @pytest.fixture
+    def admin_client(self, api_client):
+        get_user_model().objects.create_superuser(username="admin", email="admin@mail.com", password="password")
+        login(api_client, "admin", "password")
+        return api_client
+
+    def test_superuser_can_list_notifications_with_delivery_counts(self, admin_client, notification):
+        response = admin_client.get(reverse("notification-list"))
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"][0]["deliveries"] == {"pending": 0, "sent": 1, "failed": 1, "rejected": 0}
+
+    def test_superuser_can_filter_deliveries_by_status(self, admin_client, create_users, notification):
+        url = reverse("notification-deliveries", kwargs={"pk": notification.pk})
+        response = admin_client.get(url, {"status": NotificationDelivery.Status.FAILED})
+        assert response.status_code == status.HTTP_200_OK
+        assert [delivery["recipient"] for delivery in response.data["results"]] == [create_users["user2"].pk]
+
+    def test_superuser_can_retry_failed_deliveries(self, admin_client, notification):
+        response = admin_client.post(reverse("notification-retry", kwargs={"pk": notification.pk}))
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        outbox_task = OutboxTask.objects.get()
+        assert outbox_task.task_name == "events.tasks.retry_failed_deliveries"
+        assert outbox_task.args == [notification.pk]
+
+    def test_regular_user_cannot_list_notifications(self, api_client, create_users, notification):
+        login(api_client, create_users["user1"].username, "password")
+        response = api_client.get(reverse("notification-list"))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
@@ -1,12 +1,18 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import EventViewSet
+from . import async_views
+from .views import EventViewSet, NotificationViewSet
 
 router = DefaultRouter()
 router.register(r"events", EventViewSet)
+router.register(r"notifications", NotificationViewSet)
 
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("async/events/", async_views.event_list, name="async-event-list"),
+    path("async/events/changes/", async_views.event_changes, name="async-event-changes"),
+    path("async/events/<int:pk>/", async_views.event_detail, name="async-event-detail"),
+    path("async/events/<int:pk>/attendees/", async_views.event_attendees, name="async-event-attendees"),
 ]
@@ -1,20 +1,49 @@
-from common.permissions import IsAttendee, IsOwner
+import os
+import uuid
+
+from common.outbox import enqueue
+from common.permissions import IsAttendee, IsOwner, IsSuperUser, is_attendee, is_owner
+from common.views import CachedObjectMixin
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Count, Q
+from django.http import FileResponse
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 
-from .models import Event
-from .serializers import EventAttendeeSerializer, EventCancelSerializer, EventSerializer
+from .cache import cache_stats, detail_cache_key, get_cached, invalidate_event, list_cache_key, set_cached
+from .exports import (
+    ATTENDEE_EXPORT_FIELDS, CONTENT_TYPES, EVENT_EXPORT_FIELDS, ExportSerializer, attendee_rows, event_rows,
+    export_path, streaming_export,
+)
+from .filters import EventFilterBackend
+from .models import Event, ExportJob, Notification, NotificationDelivery
+from .pagination import (
+    AttendeeCursorPagination, EventCursorPagination, NotificationCursorPagination, NotificationDeliveryCursorPagination,
+)
+from .serializers import (
+    EventAttendeeSerializer, EventBulkAttendeeSerializer, EventCancelSerializer, EventSerializer,
+    NotificationDeliverySerializer, NotificationSerializer,
+)
+from .tasks import export_attendees, export_events, retry_failed_deliveries
 
 
-class EventViewSet(viewsets.ModelViewSet):
+class EventViewSet(CachedObjectMixin, viewsets.ModelViewSet):
     queryset = Event.objects.all()
+    pagination_class = EventCursorPagination
+    filter_backends = [EventFilterBackend]
 
     def get_serializer_class(self):
         if self.action == "cancel":
             return EventCancelSerializer
         elif self.action in ["attende", "remove_attendee"]:
             return EventAttendeeSerializer
+        elif self.action in ["bulk_add_attendees", "bulk_remove_attendees"]:
+            return EventBulkAttendeeSerializer
         return EventSerializer
 
     def get_permissions(self):
@@ -22,6 +51,7 @@ class EventViewSet(viewsets.ModelViewSet):
             "list": [permissions.IsAuthenticatedOrReadOnly],
             "retrieve": [permissions.IsAuthenticatedOrReadOnly],
             "create": [permissions.IsAuthenticated],
+            "bulk": [permissions.IsAuthenticated],
             "update": [permissions.IsAuthenticated, IsOwner],
             "partial_update": [permissions.IsAuthenticated, IsOwner],
             "destroy": [permissions.IsAuthenticated, IsOwner],
@@ -29,23 +59,78 @@ class EventViewSet(viewsets.ModelViewSet):
             "attendees": [permissions.IsAuthenticated, IsOwner | IsAttendee],
             "attende": [permissions.IsAuthenticated],
             "remove_attendee": [permissions.IsAuthenticated],
+            "bulk_add_attendees": [permissions.IsAuthenticated, IsOwner],
+            "bulk_remove_attendees": [permissions.IsAuthenticated, IsOwner],
+            "export": [permissions.IsAuthenticated],
+            "export_attendees": [permissions.IsAuthenticated, IsOwner | IsSuperUser],
+            "export_status": [permissions.IsAuthenticated],
+            "export_download": [permissions.IsAuthenticated],
+            "cache_stats": [permissions.IsAuthenticated, IsSuperUser],
         }
         self.permission_classes = permission_classes.get(self.action, [permissions.AllowAny])
         return super().get_permissions()
 
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(list_cache_key(request), super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            key = detail_cache_key(request, kwargs["pk"])
+        except ValueError:
+            return super().retrieve(request, *args, **kwargs)
+        return self._cached_response(key, super().retrieve, request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        event_id = instance.id
+        super().perform_destroy(instance)
+        invalidate_event(event_id)
+
+    @action(detail=False, methods=["post", "patch"])
+    def bulk(self, request):
+        if request.method == "POST":
+            serializer = self.get_serializer(data=request.data, many=True, max_length=settings.BULK_EVENTS_MAX_SIZE)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        events = self._get_owned_events(request.data)
+        serializer = self.get_serializer(
+            events, data=request.data, many=True, partial=True, max_length=settings.BULK_EVENTS_MAX_SIZE
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+    def _get_owned_events(self, data):
+        items = data if isinstance(data, list) else []
+        event_ids = [item.get("id") for item in items if isinstance(item, dict) and isinstance(item.get("id"), int)]
+        events = list(Event.objects.filter(id__in=event_ids))
+        if any(event.owner_id != self.request.user.pk for event in events):
+            raise PermissionDenied("You can only update your own events.")
+        return events
+
+    def _cached_response(self, key, view, *args, **kwargs):
+        data = get_cached(key)
+        if data is not None:
+            return Response(data)
+        response = view(*args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_cached(key, response.data)
+        return response
+
     @action(detail=True, methods=["get"])
     def attendees(self, request, pk=None):
         event = self.get_object()
-        if request.user == event.owner or request.user in event.attendees.all():
-            attendees = event.attendees.all()
-            attendee_data = [{"id": attendee.id, "username": attendee.username} for attendee in attendees]
-            return Response(attendee_data, status=status.HTTP_200_OK)
+        if is_owner(request, event) or is_attendee(request, event):
+            paginator = AttendeeCursorPagination()
+            page = paginator.paginate_queryset(event.attendees.values("id", "username"), request, view=self)
+            return paginator.get_paginated_response(page)
         return Response({"detail": "Not authorized to view attendee details"}, status=status.HTTP_403_FORBIDDEN)
 
     @action(detail=True, methods=["post"])
     def attende(self, request, pk=None):
         event = self.get_object()
-        if request.user in event.attendees.all():
+        if is_attendee(request, event):
             return Response({"detail": "User is already an attendee."}, status=status.HTTP_400_BAD_REQUEST)
         serializer = self.get_serializer(event, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
@@ -55,13 +140,29 @@ class EventViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=["post"])
     def remove_attendee(self, request, pk=None):
         event = self.get_object()
-        if request.user not in event.attendees.all():
+        if not is_attendee(request, event):
             return Response({"detail": "User is not an attendee."}, status=status.HTTP_400_BAD_REQUEST)
         serializer = self.get_serializer(event, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.remove_attendee(event)
         return Response({"status": "attendee removed"}, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=["post"])
+    def bulk_add_attendees(self, request, pk=None):
+        event = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        added_ids = serializer.add_attendees(event)
+        return Response({"added": len(added_ids)}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=["post"])
+    def bulk_remove_attendees(self, request, pk=None):
+        event = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        removed_ids = serializer.remove_attendees(event)
+        return Response({"removed": len(removed_ids)}, status=status.HTTP_200_OK)
+
     @action(detail=True, methods=["post"])
     def cancel(self, request, pk=None):
         event = self.get_object()
@@ -71,3 +172,112 @@ class EventViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response({"status": "event canceled"}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        export_type, background = self._get_export_options(request)
+        events = self.filter_queryset(self.get_queryset())
+        if background:
+            job = self._create_export_job(request, f"events-{request.user.pk}", export_type)
+            params = {key: value for key, value in request.query_params.items() if key not in ["type", "background"]}
+            enqueue(export_events, request.user.pk, params, export_type, job.path, job_id=str(job.id))
+            return self._export_job_response(request, job, status.HTTP_202_ACCEPTED)
+        if not request.user.is_superuser:
+            events = events.filter(owner=request.user)
+        return streaming_export(event_rows(events), EVENT_EXPORT_FIELDS, export_type, "events")
+
+    @action(detail=True, methods=["get"])
+    def export_attendees(self, request, pk=None):
+        event = self.get_object()
+        export_type, background = self._get_export_options(request)
+        if background:
+            job = self._create_export_job(request, f"event-{event.pk}-attendees", export_type)
+            enqueue(export_attendees, event.pk, export_type, job.path, job_id=str(job.id))
+            return self._export_job_response(request, job, status.HTTP_202_ACCEPTED)
+        return streaming_export(
+            attendee_rows(event), ATTENDEE_EXPORT_FIELDS, export_type, f"event-{event.pk}-attendees"
+        )
+
+    @action(detail=False, methods=["get"], url_path=r"exports/(?P<job_id>[0-9a-f]{32})")
+    def export_status(self, request, job_id=None):
+        return self._export_job_response(request, self._get_export_job(request, job_id), status.HTTP_200_OK)
+
+    @action(detail=False, methods=["get"], url_path=r"exports/(?P<job_id>[0-9a-f]{32})/download")
+    def export_download(self, request, job_id=None):
+        job = self._get_export_job(request, job_id)
+        if job.status != ExportJob.Status.READY:
+            return Response({"detail": "Export is not ready."}, status=status.HTTP_409_CONFLICT)
+        return FileResponse(
+            default_storage.open(job.path),
+            as_attachment=True,
+            filename=os.path.basename(job.path),
+            content_type=CONTENT_TYPES[job.path.rsplit(".", 1)[-1]],
+        )
+
+    def _get_export_options(self, request):
+        serializer = ExportSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data["type"], serializer.validated_data["background"]
+
+    def _create_export_job(self, request, prefix, export_type):
+        job_id = uuid.uuid4()
+        path = export_path(f"{prefix}-{job_id.hex}", export_type)
+        return ExportJob.objects.create(id=job_id, requested_by=request.user, path=path)
+
+    def _get_export_job(self, request, job_id):
+        jobs = ExportJob.objects.all() if request.user.is_superuser else request.user.export_jobs.all()
+        return get_object_or_404(jobs, id=job_id)
+
+    def _export_job_response(self, request, job, status_code):
+        data = {
+            "id": job.id.hex,
+            "status": job.get_status_display().lower(),
+            "url": reverse("event-export-status", kwargs={"job_id": job.id.hex}, request=request),
+            "download": None,
+        }
+        if job.status == ExportJob.Status.READY:
+            data["download"] = reverse("event-export-download", kwargs={"job_id": job.id.hex}, request=request)
+        return Response(data, status=status_code)
+
+    @action(detail=False, methods=["get"])
+    def cache_stats(self, request):
+        return Response(cache_stats(), status=status.HTTP_200_OK)
+
+
+class NotificationViewSet(CachedObjectMixin, viewsets.ReadOnlyModelViewSet):
+    queryset = Notification.objects.all()
+    serializer_class = NotificationSerializer
+    pagination_class = NotificationCursorPagination
+    permission_classes = [permissions.IsAuthenticated, IsSuperUser]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ["list", "retrieve"]:
+            queryset = queryset.annotate(
+                **{
+                    f"deliveries_{delivery_status.name.lower()}": Count(
+                        "deliveries", filter=Q(deliveries__status=delivery_status)
+                    )
+                    for delivery_status in NotificationDelivery.Status
+                }
+            )
+        return queryset
+
+    @action(detail=True, methods=["get"])
+    def deliveries(self, request, pk=None):
+        notification = self.get_object()
+        deliveries = notification.deliveries.all()
+        delivery_status = request.query_params.get("status")
+        if delivery_status:
+            if delivery_status not in NotificationDelivery.Status.values:
+                return Response({"status": "Invalid delivery status."}, status=status.HTTP_400_BAD_REQUEST)
+            deliveries = deliveries.filter(status=delivery_status)
+        paginator = NotificationDeliveryCursorPagination()
+        page = paginator.paginate_queryset(deliveries, request, view=self)
+        return paginator.get_paginated_response(NotificationDeliverySerializer(page, many=True).data)
+
+    @action(detail=True, methods=["post"])
+    def retry(self, request, pk=None):
+        notification = self.get_object()
+        enqueue(retry_failed_deliveries, notification.id)
+        return Response({"status": "retry scheduled"}, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,24 @@
+import multiprocessing
+
+# Gunicorn reads every module-level name as a setting and has one called config.
+from decouple import config as env
+
+bind = env("GUNICORN_BIND", default="0.0.0.0:8000")
+wsgi_app = env("GUNICORN_APP", default="meetmaster.wsgi:application")
+worker_class = env("GUNICORN_WORKER_CLASS", default="gthread")
+workers = env("GUNICORN_WORKERS", cast=int, default=multiprocessing.cpu_count() * 2 + 1)
+# Each thread holds its own persistent database connection.
+threads = env("GUNICORN_THREADS", cast=int, default=4)
+preload_app = env("GUNICORN_PRELOAD", cast=bool, default=True)
+timeout = env("GUNICORN_TIMEOUT", cast=int, default=30)
+keepalive = env("GUNICORN_KEEPALIVE", cast=int, default=5)
+max_requests = env("GUNICORN_MAX_REQUESTS", cast=int, default=2000)
+max_requests_jitter = env("GUNICORN_MAX_REQUESTS_JITTER", cast=int, default=200)
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    # Anything the preloaded app connected to in the master must not be shared by the forked workers.
+    from django.db import connections
+
+    connections.close_all()
@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 
 from pathlib import Path
 
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -25,9 +25,9 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = "django-insecure-d^140-d=im5ssu5orw8_3pbqz5&6k9!_4m51sme!t(7xil@4f@"
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = config("DEBUG", default=False, cast=bool)
 
-ALLOWED_HOSTS = []
+ALLOWED_HOSTS = config("ALLOWED_HOSTS", default="localhost,127.0.0.1,[::1]", cast=Csv())
 
 
 # Application definition
@@ -50,6 +50,7 @@ if config("DJANGO_DEVELOPMENT", default=False, cast=bool):
     INSTALLED_APPS.extend(["django_extensions"])
 
 MIDDLEWARE = [
+    "common.middleware.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -131,6 +132,9 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Background exports are written here; workers and web processes must share it.
+MEDIA_ROOT = config("MEDIA_ROOT", default=str(BASE_DIR / "media"))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -141,6 +145,7 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": ["rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly"],
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
+        "common.authentication.SignedTokenAuthentication",
         "rest_framework.authentication.BasicAuthentication",
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -149,6 +154,61 @@ REST_FRAMEWORK = {
 
 AUTH_USER_MODEL = "users.CustomUser"
 
+TOKEN_ACCESS_LIFETIME = config("TOKEN_ACCESS_LIFETIME", cast=int, default=900)
+TOKEN_REFRESH_LIFETIME = config("TOKEN_REFRESH_LIFETIME", cast=int, default=7 * 24 * 3600)
+TOKEN_USER_CACHE_TTL = config("TOKEN_USER_CACHE_TTL", cast=int, default=300)
+
+if config("REDIS_URL", default=None):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": config("REDIS_URL"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Share of requests profiled for queries, duplicate statements and serializer time (Server-Timing header and a log
+# line); every request is still counted and timed in /metrics.
+INSTRUMENTATION_SAMPLE_RATE = config("INSTRUMENTATION_SAMPLE_RATE", cast=float, default=0.1)
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+# Request metrics are added to this Redis so /metrics sees every web worker; without it they stay in-process.
+METRICS_REDIS_URL = config("METRICS_REDIS_URL", default=config("REDIS_URL", default=""))
+# Longest time a web worker keeps request counts before adding them to the shared store.
+METRICS_FLUSH_INTERVAL = config("METRICS_FLUSH_INTERVAL", cast=float, default=1.0)
+# Celery task metrics are written to this Redis so /metrics sees every worker; without it they stay in-process.
+TASK_METRICS_REDIS_URL = config("TASK_METRICS_REDIS_URL", default=METRICS_REDIS_URL)
+TASK_METRICS_MAX_WAIT_WINDOW = config("TASK_METRICS_MAX_WAIT_WINDOW", cast=int, default=300)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "common.middleware": {
+            "handlers": ["console"],
+            "level": config("INSTRUMENTATION_LOG_LEVEL", default="INFO"),
+        },
+    },
+}
+
+EVENT_CACHE_TTL = config("EVENT_CACHE_TTL", cast=int, default=60)
+
+EVENT_CHANGES_HEARTBEAT = config("EVENT_CHANGES_HEARTBEAT", cast=float, default=15.0)
+EVENT_CHANGES_BATCH_SIZE = config("EVENT_CHANGES_BATCH_SIZE", cast=int, default=500)
+EVENT_CHANGES_RECONNECT_DELAY = config("EVENT_CHANGES_RECONNECT_DELAY", cast=float, default=1.0)
+# The listener also reads new changes this often without a NOTIFY, e.g. after one was lost while reconnecting.
+EVENT_CHANGES_POLL_INTERVAL = config("EVENT_CHANGES_POLL_INTERVAL", cast=float, default=5.0)
+# Changes queued for a stream that is not reading them before it is disconnected to replay from the table.
+EVENT_CHANGES_SUBSCRIBER_BUFFER = config("EVENT_CHANGES_SUBSCRIBER_BUFFER", cast=int, default=1000)
+# Longest time between a change being written and its transaction committing that the change feed still picks up.
+EVENT_CHANGES_COMMIT_LAG = config("EVENT_CHANGES_COMMIT_LAG", cast=float, default=10.0)
+EVENT_CHANGES_RETENTION = config("EVENT_CHANGES_RETENTION", cast=int, default=24 * 3600)
+
 CELERY_BROKER_URL = config("CELERY_BROKER_URL")
 CELERY_RESULT_BACKEND = config("CELERY_RESULT_BACKEND")
 
@@ -157,11 +217,41 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = "UTC"
 
+# Events are finished by ETA tasks scheduled EVENT_FINISH_SCHEDULE_HORIZON seconds ahead (kept below the Redis
+# visibility timeout); update_event_statuses only sweeps up anything those tasks missed. Each run looks one interval
+# ahead plus a margin for a late beat, so only events in the margin are scheduled twice and finish_event ignores those.
+EVENT_FINISH_SCHEDULE_INTERVAL = config("EVENT_FINISH_SCHEDULE_INTERVAL", cast=int, default=600)
+EVENT_FINISH_SCHEDULE_MARGIN = config("EVENT_FINISH_SCHEDULE_MARGIN", cast=int, default=60)
+EVENT_FINISH_SCHEDULE_HORIZON = EVENT_FINISH_SCHEDULE_INTERVAL + EVENT_FINISH_SCHEDULE_MARGIN
+
+# Celery tasks enqueued from requests are written to common.OutboxTask and published by relay_outbox.
+OUTBOX_RELAY_INTERVAL = config("OUTBOX_RELAY_INTERVAL", cast=float, default=1.0)
+
 CELERY_BEAT_SCHEDULE = {
-    "update_event_statuses": {"task": "events.tasks.update_event_statuses", "schedule": 30.0},
+    "relay_outbox": {"task": "common.tasks.relay_outbox", "schedule": OUTBOX_RELAY_INTERVAL},
+    "schedule_due_event_finishes": {
+        "task": "events.tasks.schedule_due_event_finishes",
+        "schedule": float(EVENT_FINISH_SCHEDULE_INTERVAL),
+    },
+    "update_event_statuses": {"task": "events.tasks.update_event_statuses", "schedule": 900.0},
+    "reconcile_attendee_counts": {"task": "events.tasks.reconcile_attendee_counts", "schedule": 3600.0},
+    "flush_pending_notifications": {"task": "events.tasks.flush_pending_notifications", "schedule": 10.0},
+    "prune_event_changes": {"task": "events.tasks.prune_event_changes", "schedule": 3600.0},
 }
 
 DEFAULT_FROM_EMAIL = config("DEFAULT_FROM_EMAIL")
+NOTIFICATION_CHUNK_SIZE = config("NOTIFICATION_CHUNK_SIZE", cast=int, default=500)
+NOTIFICATION_COALESCE_WINDOW = config("NOTIFICATION_COALESCE_WINDOW", cast=int, default=60)
+# Longest delay between retries of a notification chunk after an SMTP error.
+NOTIFICATION_RETRY_BACKOFF_MAX = config("NOTIFICATION_RETRY_BACKOFF_MAX", cast=int, default=600)
+# How long a chunk task may take to send the deliveries it claimed before they can be claimed again.
+NOTIFICATION_DELIVERY_LEASE = config("NOTIFICATION_DELIVERY_LEASE", cast=int, default=900)
+# Deliveries still pending this many seconds after they were queued are queued again by flush_pending_notifications.
+NOTIFICATION_DELIVERY_STALE_AFTER = config("NOTIFICATION_DELIVERY_STALE_AFTER", cast=int, default=3600)
+BULK_ATTENDEES_MAX_SIZE = config("BULK_ATTENDEES_MAX_SIZE", cast=int, default=10000)
+BULK_EVENTS_MAX_SIZE = config("BULK_EVENTS_MAX_SIZE", cast=int, default=500)
+EXPORT_CHUNK_SIZE = config("EXPORT_CHUNK_SIZE", cast=int, default=2000)
+EXPORTS_DIR = config("EXPORTS_DIR", default="exports")
 if config("EMAIL_HOST", default=None):
     EMAIL_HOST = config("EMAIL_HOST")
     EMAIL_HOST_USER = config("EMAIL_HOST_USER")
@@ -0,0 +1,24 @@
+from .settings import *  # noqa: F401, F403
+from .settings import DATABASES, config
+
+SECRET_KEY = config("SECRET_KEY")
+DEBUG = False
+
+# Django 5.0 has no built-in connection pool, so every web thread and Celery worker process keeps one persistent
+# connection, checked before reuse. The database must allow GUNICORN_WORKERS * GUNICORN_THREADS connections per web
+# instance plus CELERY_WORKER_CONCURRENCY per worker. Set DB_CONN_MAX_AGE=0 for ASGI servers: their requests run in
+# short-lived threads that would never reuse a persistent connection.
+DATABASES["default"].update(
+    {
+        "CONN_MAX_AGE": config("DB_CONN_MAX_AGE", cast=int, default=600),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {"connect_timeout": config("DB_CONNECT_TIMEOUT", cast=int, default=5)},
+    }
+)
+
+CELERY_WORKER_CONCURRENCY = config("CELERY_WORKER_CONCURRENCY", cast=int, default=4)
+CELERY_WORKER_MAX_TASKS_PER_CHILD = config("CELERY_WORKER_MAX_TASKS_PER_CHILD", cast=int, default=1000)
+
+SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
+SESSION_COOKIE_SECURE = config("SESSION_COOKIE_SECURE", cast=bool, default=True)
+CSRF_COOKIE_SECURE = config("CSRF_COOKIE_SECURE", cast=bool, default=True)
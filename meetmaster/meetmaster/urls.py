@@ -15,6 +15,7 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from common.views import metrics
 from django.contrib import admin
 from django.urls import include, path
 
@@ -30,4 +31,5 @@ urlpatterns = [
         ),
     ),
     path("api-auth/", include("rest_framework.urls", namespace="rest_framework")),
+    path("metrics", metrics, name="metrics"),
 ]
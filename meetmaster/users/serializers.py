@@ -1,10 +1,13 @@
-from django.contrib.auth import get_user_model
-from rest_framework import serializers
+from common.authentication import REFRESH_SALT, get_token_user, issue_tokens
+from common.serializers import TimedSerializerMixin
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from rest_framework import exceptions, serializers
 
 CustomUser = get_user_model()
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
 
     def validate_email(self, value):
@@ -48,7 +51,7 @@ class DetailedUserSerializer(UserSerializer):
         fields = ["id", "username", "first_name", "last_name", "email", "profile_image", "date_joined"]
 
 
-class UserUpdateSerializer(serializers.ModelSerializer):
+class UserUpdateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ["username", "first_name", "last_name", "profile_image", "email"]
@@ -59,3 +62,25 @@ class ChangePasswordSerializer(serializers.Serializer):
 
     old_password = serializers.CharField(required=True)
     new_password = serializers.CharField(required=True)
+
+
+class UserEventsFilterSerializer(serializers.Serializer):
+    when = serializers.ChoiceField(choices=["upcoming", "past"], required=False)
+
+
+class TokenObtainSerializer(serializers.Serializer):
+    username = serializers.CharField()
+    password = serializers.CharField(write_only=True)
+
+    def validate(self, attrs):
+        user = authenticate(self.context["request"], username=attrs["username"], password=attrs["password"])
+        if user is None:
+            raise exceptions.AuthenticationFailed("Invalid credentials.")
+        return issue_tokens(user)
+
+
+class TokenRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+    def validate(self, attrs):
+        return issue_tokens(get_token_user(attrs["refresh"], REFRESH_SALT, settings.TOKEN_REFRESH_LIFETIME))
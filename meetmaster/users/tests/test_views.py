@@ -4,6 +4,8 @@ import pytest
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from django.utils import timezone
+from events.models import Event
 from PIL import Image
 from rest_framework import status
 from rest_framework.test import APIClient
@@ -34,6 +36,16 @@ def login(api_client, username, password):
     api_client.login(username=username, password=password)
 
 
+def create_event(owner, days):
+    return Event.objects.create(
+        title=f"Event in {days} days",
+        description="Description",
+        date=timezone.now() + timezone.timedelta(days=days),
+        location="Location",
+        owner=owner,
+    )
+
+
 def create_test_image_file():
     file = BytesIO()
     image = Image.new("RGB", (100, 100), color=(73, 109, 137))
@@ -89,6 +101,14 @@ class TestUserViewSet:
         assert response.status_code == status.HTTP_200_OK
         assert "username" in response.data
 
+    def test_user_retrieve_fetches_profile_once(self, api_client, create_users, django_assert_num_queries):
+        user1 = create_users["user1"]
+        login(api_client, user1.username, "password")
+        # Session and authenticated user lookups, then a single query for the retrieved profile.
+        with django_assert_num_queries(3):
+            response = api_client.get(reverse("customuser-detail", kwargs={"pk": user1.pk}))
+        assert response.data["email"] == user1.email
+
     def test_user_can_update_own_profile(self, api_client, create_users):
         user1 = create_users["user1"]
         login(api_client, "user1", "password")
@@ -181,3 +201,94 @@ class TestUserViewSet:
         assert response.status_code == status.HTTP_200_OK
         user1.refresh_from_db()
         assert user1.check_password("new_password")
+
+    def test_user_events_are_paginated_and_filtered_by_time(self, api_client, create_users):
+        user1 = create_users["user1"]
+        past, soon, later = create_event(user1, -1), create_event(user1, 1), create_event(user1, 2)
+        create_event(create_users["user2"], 1)
+        login(api_client, "user2", "password")
+        url = reverse("customuser-events", kwargs={"pk": user1.pk})
+
+        response = api_client.get(url)
+        assert [event["id"] for event in response.data["results"]] == [later.id, soon.id, past.id]
+
+        response = api_client.get(url, {"when": "upcoming", "page_size": 1})
+        assert [event["id"] for event in response.data["results"]] == [soon.id]
+        response = api_client.get(response.data["next"])
+        assert [event["id"] for event in response.data["results"]] == [later.id]
+
+        response = api_client.get(url, {"when": "past"})
+        assert [event["id"] for event in response.data["results"]] == [past.id]
+
+    def test_user_events_rejects_invalid_time_filter(self, api_client, create_users):
+        login(api_client, "user1", "password")
+        response = api_client.get(reverse("customuser-events", kwargs={"pk": create_users["user1"].pk}), {"when": "x"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_user_can_list_events_they_attend(self, api_client, create_users):
+        user1 = create_users["user1"]
+        attending = create_event(create_users["user2"], 1)
+        attending.attendees.add(user1)
+        create_event(create_users["user2"], 2)
+        login(api_client, "user1", "password")
+        response = api_client.get(reverse("customuser-attending", kwargs={"pk": user1.pk}))
+        assert response.status_code == status.HTTP_200_OK
+        assert [event["id"] for event in response.data["results"]] == [attending.id]
+
+    def test_user_cannot_list_events_other_user_attends(self, api_client, create_users):
+        login(api_client, "user2", "password")
+        response = api_client.get(reverse("customuser-attending", kwargs={"pk": create_users["user1"].pk}))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_user_can_authenticate_with_signed_token(self, api_client, create_users, django_assert_num_queries):
+        user1 = create_users["user1"]
+        response = api_client.post(reverse("customuser-token"), {"username": "user1", "password": "password"})
+        assert response.status_code == status.HTTP_200_OK
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        url = reverse("customuser-detail", kwargs={"pk": user1.pk})
+        assert api_client.get(url).data["email"] == user1.email
+
+        # The token user is cached, so only the looked-up profile hits the database.
+        with django_assert_num_queries(1):
+            assert api_client.get(url).status_code == status.HTTP_200_OK
+
+    def test_token_issue_rejects_wrong_password(self, api_client, create_users):
+        response = api_client.post(reverse("customuser-token"), {"username": "user1", "password": "wrong"})
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert "access" not in response.data
+
+    def test_invalid_token_is_rejected(self, api_client, create_users):
+        api_client.credentials(HTTP_AUTHORIZATION="Bearer not-a-token")
+        response = api_client.get(reverse("customuser-detail", kwargs={"pk": create_users["user1"].pk}))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_refresh_token_issues_new_access_token(self, api_client, create_users):
+        tokens = api_client.post(reverse("customuser-token"), {"username": "user1", "password": "password"}).data
+        response = api_client.post(reverse("customuser-token-refresh"), {"refresh": tokens["refresh"]})
+        assert response.status_code == status.HTTP_200_OK
+        assert set(response.data) == {"access", "refresh", "expires_in"}
+
+        response = api_client.post(reverse("customuser-token-refresh"), {"refresh": tokens["access"]})
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_password_change_revokes_tokens(self, api_client, create_users):
+        user1 = create_users["user1"]
+        tokens = api_client.post(reverse("customuser-token"), {"username": "user1", "password": "password"}).data
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        url = reverse("customuser-change-password", kwargs={"pk": user1.pk})
+        response = api_client.post(url, {"old_password": "password", "new_password": "new_password"})
+        assert response.status_code == status.HTTP_200_OK
+
+        response = api_client.get(reverse("customuser-detail", kwargs={"pk": user1.pk}))
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_deactivating_user_outside_the_api_revokes_cached_token_user(self, api_client, create_users):
+        user1 = create_users["user1"]
+        tokens = api_client.post(reverse("customuser-token"), {"username": "user1", "password": "password"}).data
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        url = reverse("customuser-detail", kwargs={"pk": user1.pk})
+        assert api_client.get(url).status_code == status.HTTP_200_OK
+
+        user1.is_active = False
+        user1.save()
+        assert api_client.get(url).status_code == status.HTTP_403_FORBIDDEN
@@ -1,4 +1,9 @@
-from common.permissions import IsSuperUser, IsSuperUserOrSelf
+from common.permissions import IsSuperUser, IsSuperUserOrSelf, is_self
+from common.views import CachedObjectMixin
+from django.utils import timezone
+from events.models import Event
+from events.pagination import EventCursorPagination, UpcomingEventCursorPagination
+from events.serializers import EventSerializer
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -6,11 +11,12 @@ from rest_framework.response import Response
 
 from .models import CustomUser
 from .serializers import (
-    ChangePasswordSerializer, DetailedUserSerializer, PublicUserSerializer, UserSerializer, UserUpdateSerializer,
+    ChangePasswordSerializer, DetailedUserSerializer, PublicUserSerializer, TokenObtainSerializer,
+    TokenRefreshSerializer, UserEventsFilterSerializer, UserSerializer, UserUpdateSerializer,
 )
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(CachedObjectMixin, viewsets.ModelViewSet):
     queryset = CustomUser.objects.all().order_by("id")
 
     def get_serializer_class(self):
@@ -19,13 +25,19 @@ class UserViewSet(viewsets.ModelViewSet):
         elif self.action == "retrieve":
             return (
                 DetailedUserSerializer
-                if self.request.user.is_superuser or self.request.user == self.get_object()
+                if self.request.user.is_superuser or is_self(self.request, self.get_object())
                 else PublicUserSerializer
             )
         elif self.action in ["update", "partial_update"]:
             return UserUpdateSerializer
         elif self.action == "change_password":
             return ChangePasswordSerializer
+        elif self.action == "token":
+            return TokenObtainSerializer
+        elif self.action == "token_refresh":
+            return TokenRefreshSerializer
+        elif self.action in ["events", "attending"]:
+            return EventSerializer
         return PublicUserSerializer
 
     def get_permissions(self):
@@ -37,10 +49,26 @@ class UserViewSet(viewsets.ModelViewSet):
             "partial_update": [IsAuthenticated, IsSuperUserOrSelf],
             "destroy": [IsAuthenticated, IsSuperUserOrSelf],
             "change_password": [IsAuthenticated, IsSuperUserOrSelf],
+            "events": [IsAuthenticated],
+            "attending": [IsAuthenticated, IsSuperUserOrSelf],
+            "token": [AllowAny],
+            "token_refresh": [AllowAny],
         }
         self.permission_classes = permission_classes.get(self.action, [AllowAny])
         return super().get_permissions()
 
+    @action(detail=False, methods=["post"], authentication_classes=[])
+    def token(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.validated_data, status=200)
+
+    @action(detail=False, methods=["post"], authentication_classes=[])
+    def token_refresh(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.validated_data, status=200)
+
     @action(detail=True, methods=["post"])
     def change_password(self, request, pk=None):
         user = self.get_object()
@@ -53,3 +81,27 @@ class UserViewSet(viewsets.ModelViewSet):
         user.set_password(serializer.validated_data["new_password"])
         user.save()
         return Response({"status": "password changed"}, status=200)
+
+    @action(detail=True, methods=["get"])
+    def events(self, request, pk=None):
+        user = self.get_object()
+        return self._paginated_events(Event.objects.filter(owner_id=user.pk))
+
+    @action(detail=True, methods=["get"])
+    def attending(self, request, pk=None):
+        user = self.get_object()
+        return self._paginated_events(Event.objects.filter(attendees=user.pk))
+
+    def _paginated_events(self, events):
+        serializer = UserEventsFilterSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        when = serializer.validated_data.get("when")
+        if when == "upcoming":
+            events = events.filter(date__gte=timezone.now())
+            paginator = UpcomingEventCursorPagination()
+        else:
+            if when == "past":
+                events = events.filter(date__lt=timezone.now())
+            paginator = EventCursorPagination()
+        page = paginator.paginate_queryset(events, self.request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)